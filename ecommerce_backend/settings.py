@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +54,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store.middleware.IdentityMapMiddleware',
+    'store.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'ecommerce_backend.urls'
@@ -81,6 +84,55 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# Moneda de la tienda; los pagos en otra moneda se rechazan
+STORE_CURRENCY = 'USD'
+
+# Configuración de PayPal
+PAYPAL_CLIENT_ID = os.environ.get('PAYPAL_CLIENT_ID', '')
+PAYPAL_SECRET_KEY = os.environ.get('PAYPAL_SECRET_KEY', '')
+PAYPAL_API_URL = os.environ.get('PAYPAL_API_URL', 'https://api-m.sandbox.paypal.com')
+# ID del webhook registrado en PayPal; necesario para verificar las firmas
+PAYPAL_WEBHOOK_ID = os.environ.get('PAYPAL_WEBHOOK_ID', '')
+PAYPAL_WEBHOOK_BATCH_SIZE = 50  # eventos por lote (store.payments)
+PAYPAL_WEBHOOK_MAX_ATTEMPTS = 5  # reintentos si el checkout aún no está registrado
+
+# URLs notificadas cuando se registra una orden
+ORDER_WEBHOOK_URLS = []
+
+# Cola de trabajos en segundo plano (manage.py run_worker)
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30  # segundos, se duplica en cada reintento
+JOB_TIMEOUT = 600  # segundos antes de reencolar un trabajo abandonado
+JOB_REQUEUE_INTERVAL = 60  # cada cuántos segundos busca cada worker trabajos abandonados
+
+# Compresión de respuestas (store.middleware.CompressionMiddleware). text/html
+# queda fuera: las páginas del admin llevan el token CSRF y serían vulnerables a BREACH
+COMPRESSION_MIN_SIZE = 1024  # bytes
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'application/x-ndjson',
+    'text/plain',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+]
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Popularidad de productos (store.popularity)
+POPULARITY_FLUSH_INTERVAL = 10  # segundos entre escrituras de contadores
+POPULARITY_FLUSH_SIZE = 500  # eventos acumulados que fuerzan una escritura
+POPULARITY_FLUSH_THREAD = True  # False: sin hilo, escribe la petición que llena el búfer
+POPULARITY_HALF_LIFE_HOURS = 72
+POPULARITY_WINDOW_DAYS = 30
+POPULARITY_CART_WEIGHT = 5.0  # un añadido al carrito vale como 5 vistas
+POPULARITY_TOP = 500
+POPULARITY_RECENTLY_VIEWED_TTL = 30 * 86400  # segundos que se conserva el historial de cada usuario
+
+# Productos "comprados juntos" (store.recommendations)
+RECOMMENDATIONS_TOP_K = 10
+RECOMMENDATIONS_MIN_SUPPORT = 2
+
 # Configuración de Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -96,6 +148,44 @@ DATABASES = {
 }
 
 
+# Caché compartida. En producción se usa Redis (REDIS_URL) para que todos
+# los workers vean las mismas entradas e invalidaciones; LocMemCache solo
+# sirve con un único proceso (manage.py check --deploy lo advierte).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ecommerce-backend',
+        }
+    }
+
+# Caché de dos niveles del catálogo (store.cache)
+CATALOGUE_CACHE_ALIAS = 'default'
+CATALOGUE_CACHE_TTL = 300  # segundos en la caché compartida
+CATALOGUE_CACHE_LOCAL_TTL = 5  # segundos en la memoria de cada proceso
+CATALOGUE_CACHE_LOCAL_SIZE = 1024
+
+# Precalentamiento al arrancar cada worker (store.warmup)
+STORE_WARMUP_ON_BOOT = True
+STORE_WARMUP_PRODUCTS = 200
+
+# Perfilado bajo demanda (store.profiling); se puede cambiar en caliente
+# desde /api/profiling/config/
+PROFILING_ENABLED = False
+PROFILING_ROUTES = []  # prefijos de ruta; vacío = todas
+PROFILING_SAMPLE_RATE = 0.01  # fracción de peticiones perfiladas
+PROFILING_MODE = 'cprofile'  # 'cprofile' (pstats) o 'sample' (pilas colapsadas)
+PROFILING_SAMPLE_INTERVAL = 0.005  # segundos entre muestras en modo 'sample'
+PROFILING_BUFFER_SIZE = 50  # muestras conservadas
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings')
 
 application = get_wsgi_application()
+
+# Cada worker arranca con las categorías y los productos más recientes en caché
+from store.warmup import warmup_on_boot  # noqa: E402
+
+warmup_on_boot()
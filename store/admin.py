@@ -1,5 +1,42 @@
-from django.contrib import admin
-from .models import Category, Product, CartItem, CouponUsage, Coupon, Discount
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .signals import bump_on_commit
+from .models import Category, Product, CartItem, CouponUsage, Coupon, Discount, StockReservation, Order, OrderLine, Job, PopularProduct, CouponCampaign, PaymentEvent, PendingPayment
+
+
+class EstimatedCountPaginator(Paginator):
+    # Por encima de este umbral se usa la estimación del planificador en vez de COUNT(*)
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                        [queryset.model._meta.db_table]
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] > self.estimate_threshold:
+                    return int(row[0])
+        return super().count
+
+
+class ApplyDiscountForm(ActionForm):
+    discount = forms.ModelChoiceField(
+        queryset=Discount.objects.filter(active=True).order_by('-start_date'),
+        required=False,
+        label='Descuento'
+    )
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -10,44 +47,147 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'category', 'price', 'stock', 'available', 'created']
+    list_display = ['name', 'slug', 'category', 'price', 'stock', 'reserved', 'available', 'created']
     list_filter = ['available', 'created', 'updated', 'category']
     list_editable = ['price', 'stock', 'available']
+    list_select_related = ['category']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     raw_id_fields = ['category']
-    date_hierarchy = 'created'
     ordering = ['created']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = ApplyDiscountForm
+    actions = ['apply_discount']
+
+    @admin.action(description='Aplicar descuento a los productos seleccionados')
+    def apply_discount(self, request, queryset):
+        discount = None
+        discount_id = request.POST.get('discount')
+        if discount_id:
+            discount = Discount.objects.filter(pk=discount_id).first()
+        if discount is None:
+            self.message_user(request, 'Seleccione un descuento', messages.WARNING)
+            return
+
+        # Un solo INSERT para toda la selección en lugar de guardar fila por fila
+        through = Discount.products.through
+        # ignore_conflicts no informa de qué filas se insertaron: se cuentan antes
+        # los productos que ya tenían el descuento para informar solo de los nuevos
+        existing = through.objects.filter(discount_id=discount.pk, product__in=queryset).count()
+        links = [
+            through(discount_id=discount.pk, product_id=product_id)
+            for product_id in queryset.values_list('pk', flat=True).iterator()
+        ]
+        through.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+        # bulk_create no emite m2m_changed
+        bump_on_commit('product')
+        self.message_user(
+            request,
+            f'Descuento "{discount.name}" aplicado a {len(links) - existing} productos nuevos',
+            messages.SUCCESS
+        )
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ['product', 'quantity', 'created']
     list_filter = ['created']
+    list_select_related = ['product']
     raw_id_fields = ['product']
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'cart_item', 'expires_at', 'created']
+    list_select_related = ['product', 'cart_item']
+    raw_id_fields = ['product', 'cart_item']
+    ordering = ['expires_at']
     
 @admin.register(Discount)
 class DiscountAdmin(admin.ModelAdmin):
     list_display = ['name', 'discount_type', 'value', 'active', 'start_date', 'end_date']
     list_filter = ['active', 'discount_type', 'start_date', 'end_date']
     search_fields = ['name', 'description']
-    filter_horizontal = ['products'] 
-    date_hierarchy = 'start_date'
+    raw_id_fields = ['products']
     ordering = ['-start_date']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(CouponCampaign)
+class CouponCampaignAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code_prefix', 'discount_value', 'is_percentage', 'valid_from', 'valid_to']
+    search_fields = ['name', 'code_prefix']
+    ordering = ['-created']
 
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ['code', 'discount_value', 'is_percentage', 'active', 'valid_from', 'valid_to', 'current_uses']
-    list_filter = ['active', 'is_percentage', 'valid_from', 'valid_to']
-    search_fields = ['code', 'description']
-    date_hierarchy = 'valid_from'
+    list_display = ['code', 'campaign', 'discount_value', 'is_percentage', 'active', 'valid_from', 'valid_to', 'current_uses']
+    list_filter = ['active', 'is_percentage', 'valid_from', 'valid_to', 'campaign']
+    list_select_related = ['campaign']
+    # Con campañas de cientos de miles de códigos, el código se busca por coincidencia exacta
+    search_fields = ['=code', 'description']
+    raw_id_fields = ['campaign']
     ordering = ['-valid_from']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(CouponUsage)
 class CouponUsageAdmin(admin.ModelAdmin):
     list_display = ['coupon', 'user', 'used_at', 'order_total', 'discount_amount']
     list_filter = ['used_at']
+    list_select_related = ['coupon', 'user']
     search_fields = ['coupon__code', 'user__username']
-    date_hierarchy = 'used_at'
+    raw_id_fields = ['coupon', 'user']
     ordering = ['-used_at']
-    
-    
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    raw_id_fields = ['product']
+    extra = 0
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['payment_id', 'user', 'status', 'coupon', 'total', 'created']
+    list_filter = ['status', 'created']
+    list_select_related = ['user', 'coupon']
+    search_fields = ['payment_id', 'user__username']
+    raw_id_fields = ['user', 'coupon']
+    inlines = [OrderLineInline]
+    ordering = ['-created']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'duration_ms', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name']
+    ordering = ['-run_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(PopularProduct)
+class PopularProductAdmin(admin.ModelAdmin):
+    list_display = ['rank', 'product', 'score', 'computed_at']
+    list_select_related = ['product']
+    raw_id_fields = ['product']
+    ordering = ['rank']
+
+@admin.register(PendingPayment)
+class PendingPaymentAdmin(admin.ModelAdmin):
+    list_display = ['payment_id', 'user', 'status', 'order', 'created']
+    list_filter = ['status']
+    search_fields = ['=payment_id']
+    raw_id_fields = ['user', 'order']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event_type', 'payment_id', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['=event_id', '=payment_id']
+    ordering = ['-received_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .warmup import warm_serializers
+
+        # Sin consultas a la base de datos aquí: ready() también corre en
+        # migrate. El catálogo se precalienta desde wsgi.py/asgi.py.
+        warm_serializers()
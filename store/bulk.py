@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, IntegerField, Value
+from django.db.models.functions import Cast, Ceil, Greatest, Round
+from django.utils import timezone
+
+from .models import Product
+from .signals import bump_on_commit
+
+
+DEFAULT_CHUNK_SIZE = 1000
+FIELDS = ['price', 'stock']
+OPERATIONS = ['set', 'add', 'percent', 'round99']
+
+
+class BulkUpdateError(Exception):
+    pass
+
+
+def select_products(categories=None, discount=None, slugs=None):
+    # Sin ningún filtro no se actualiza nada: evita repreciar todo el catálogo por error
+    if not categories and discount is None and not slugs:
+        raise BulkUpdateError('Indique al menos un filtro (categoría, descuento o slugs)')
+    queryset = Product.objects.all()
+    if categories:
+        queryset = queryset.filter(category__slug__in=categories)
+    if discount is not None:
+        queryset = queryset.filter(discounts=discount)
+    if slugs:
+        queryset = queryset.filter(slug__in=slugs)
+    return queryset
+
+
+def _price(expression):
+    return Cast(expression, DecimalField(max_digits=10, decimal_places=2))
+
+
+def update_expression(field, operation, value=None, round_99=False):
+    if field not in FIELDS:
+        raise BulkUpdateError(f'Campo no válido: {field}')
+    if operation not in OPERATIONS:
+        raise BulkUpdateError(f'Operación no válida: {operation}')
+    if operation != 'round99' and value is None:
+        raise BulkUpdateError('La operación necesita un valor')
+
+    if field == 'stock':
+        if operation == 'round99' or round_99:
+            raise BulkUpdateError('El redondeo a .99 solo se aplica al precio')
+        if operation == 'set':
+            expression = Value(int(value))
+        elif operation == 'add':
+            expression = F('stock') + int(value)
+        else:
+            expression = Cast(Round(F('stock') * (1 + Decimal(value) / 100)), IntegerField())
+        # El stock nunca baja de lo reservado en carritos
+        return Greatest(expression, F('reserved'))
+
+    if operation == 'set':
+        expression = Value(Decimal(value))
+    elif operation == 'add':
+        expression = F('price') + Decimal(value)
+    elif operation == 'percent':
+        expression = Round(F('price') * (1 + Decimal(value) / 100), 2)
+    else:
+        expression = F('price')
+    if operation == 'round99' or round_99:
+        # 12.30 -> 12.99, 12.00 -> 11.99
+        expression = Ceil(expression) - Decimal('0.01')
+    return _price(Greatest(expression, Value(Decimal('0'))))
+
+
+def bulk_update_products(queryset, field, operation, value=None, round_99=False, chunk_size=None):
+    expression = update_expression(field, operation, value, round_99)
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+
+    # Se recorre por rangos de clave primaria y cada bloque es un único
+    # UPDATE en su propia transacción; la caché se invalida una vez por bloque
+    updated = chunks = 0
+    last_pk = 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            updated += Product.objects.filter(pk__in=chunk).update(
+                **{field: expression},
+                updated=timezone.now()
+            )
+            bump_on_commit('product')
+        chunks += 1
+        last_pk = chunk[-1]
+    return {'updated': updated, 'chunks': chunks}
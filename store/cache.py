@@ -0,0 +1,186 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+DEFAULT_LOCAL_TTL = 5
+DEFAULT_LOCAL_SIZE = 1024
+DEFAULT_SHARED_TTL = 300
+FILL_LOCK_TIMEOUT = 10
+FILL_WAIT = 2.0
+FILL_POLL_INTERVAL = 0.05
+
+
+def is_shared_cache(alias):
+    # LocMemCache vive en la memoria de cada proceso: con varios workers cada
+    # uno tendría sus propias versiones, candados y entradas
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+class LocalLRU:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self, prefix=None):
+        with self._lock:
+            if prefix is None:
+                self._data.clear()
+                return
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+
+# Caché de dos niveles: un LRU en memoria del proceso con TTL corto delante
+# de la caché compartida de Django. Las claves llevan la versión de su
+# espacio de nombres ('category', 'product'); al guardar un modelo se
+# incrementa la versión y las entradas anteriores dejan de leerse.
+# Con varios procesos la caché CATALOGUE_CACHE_ALIAS tiene que ser compartida
+# (Redis en producción): con LocMemCache una invalidación solo llega al
+# proceso que la hace. `manage.py check --deploy` avisa de ello.
+class TwoTierCache:
+    def __init__(self, alias=None, local_ttl=None, local_size=None, ttl=None):
+        self.alias = alias or getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default')
+        self.ttl = ttl or getattr(settings, 'CATALOGUE_CACHE_TTL', DEFAULT_SHARED_TTL)
+        self.local = LocalLRU(
+            local_size or getattr(settings, 'CATALOGUE_CACHE_LOCAL_SIZE', DEFAULT_LOCAL_SIZE),
+            local_ttl or getattr(settings, 'CATALOGUE_CACHE_LOCAL_TTL', DEFAULT_LOCAL_TTL)
+        )
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def reset_stats(self):
+        self._stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'invalidations': 0,
+        }
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['shared_backend'] = is_shared_cache(self.alias)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = (lookups - stats['misses']) / lookups if lookups else None
+        return stats
+
+    def _version_key(self, namespace):
+        return f'catalogue:{namespace}:version'
+
+    def version(self, namespace):
+        local_key = f'version:{namespace}'
+        version = self.local.get(local_key)
+        if version is not None:
+            return version
+        version = self.shared.get(self._version_key(namespace))
+        if version is None:
+            # Se parte de una marca de tiempo para no reutilizar versiones
+            # anteriores si la clave fue desalojada de la caché compartida
+            self.shared.add(self._version_key(namespace), int(time.time() * 1000), timeout=None)
+            version = self.shared.get(self._version_key(namespace))
+        self.local.set(local_key, version)
+        return version
+
+    def bump(self, namespace):
+        try:
+            self.shared.incr(self._version_key(namespace))
+        except ValueError:
+            self.shared.set(self._version_key(namespace), int(time.time() * 1000), timeout=None)
+        self.local.clear(f'version:{namespace}')
+        self.local.clear(f'catalogue:{namespace}:')
+        self._count('invalidations')
+
+    def make_key(self, namespace, key):
+        return f'catalogue:{namespace}:{self.version(namespace)}:{key}'
+
+    def set(self, namespace, key, value):
+        full_key = self.make_key(namespace, key)
+        entry = (value,)
+        self.shared.set(full_key, entry, self.ttl)
+        self.local.set(full_key, entry)
+
+    def get_or_set(self, namespace, key, fill):
+        full_key = self.make_key(namespace, key)
+        # Los valores se guardan envueltos en una tupla para poder cachear None
+        entry = self.local.get(full_key)
+        if entry is not None:
+            self._count('local_hits')
+            return entry[0]
+        entry = self.shared.get(full_key)
+        if entry is not None:
+            self._count('shared_hits')
+            self.local.set(full_key, entry)
+            return entry[0]
+
+        # Solo un hilo por proceso y un proceso en total rellenan cada clave
+        with self._locks[hash(full_key) % len(self._locks)]:
+            entry = self.local.get(full_key)
+            if entry is not None:
+                self._count('coalesced')
+                return entry[0]
+
+            lock_key = f'{full_key}:fill'
+            token = uuid.uuid4().hex
+            if not self.shared.add(lock_key, token, timeout=FILL_LOCK_TIMEOUT):
+                token = None
+                deadline = time.monotonic() + FILL_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(FILL_POLL_INTERVAL)
+                    entry = self.shared.get(full_key)
+                    if entry is not None:
+                        self._count('coalesced')
+                        self.local.set(full_key, entry)
+                        return entry[0]
+
+            try:
+                self._count('misses')
+                entry = (fill(),)
+                self.shared.set(full_key, entry, self.ttl)
+                self.local.set(full_key, entry)
+            finally:
+                # Quien rellena tras agotar la espera no tiene el candado: solo
+                # lo borra su dueño, y solo si no expiró y lo tomó otro proceso
+                if token is not None and self.shared.get(lock_key) == token:
+                    self.shared.delete(lock_key)
+            return entry[0]
+
+
+catalogue_cache = TwoTierCache()
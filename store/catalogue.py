@@ -0,0 +1,75 @@
+from .cache import catalogue_cache
+from .models import Category, Discount, Product
+
+
+CATEGORY_VALUES = ['id', 'name', 'slug', 'description', 'image']
+PRODUCT_VALUES = [
+    'id', 'category_id', 'name', 'slug', 'description', 'price',
+    'stock', 'available', 'image', 'created', 'updated'
+]
+DISCOUNT_VALUES = [
+    'id', 'name', 'description', 'discount_type', 'value',
+    'active', 'start_date', 'end_date'
+]
+
+
+def category_rows():
+    # El conjunto de categorías es pequeño: se cachea completo, indexado por id
+    return catalogue_cache.get_or_set(
+        'category', 'all',
+        lambda: {row['id']: row for row in Category.objects.values(*CATEGORY_VALUES)}
+    )
+
+
+def category_row(pk):
+    row = category_rows().get(pk)
+    if row is None:
+        # Categoría recién creada que aún no llegó a la caché local
+        row = Category.objects.values(*CATEGORY_VALUES).filter(pk=pk).first()
+    return row
+
+
+def category_by_slug(slug):
+    for row in category_rows().values():
+        if row['slug'] == slug:
+            return row
+    return None
+
+
+def product_discount_rows(product_ids):
+    # Descuentos activos por producto; la vigencia por fechas se evalúa al
+    # serializar para que el valor cacheado no dependa del momento de carga
+    discounts = {}
+    links = Discount.products.through.objects.filter(
+        product_id__in=product_ids,
+        discount__active=True
+    ).order_by('pk').values(
+        'product_id', *[f'discount__{field}' for field in DISCOUNT_VALUES]
+    )
+    for link in links:
+        discount = {field: link[f'discount__{field}'] for field in DISCOUNT_VALUES}
+        discounts.setdefault(link['product_id'], []).append(discount)
+    return discounts
+
+
+def _load_product(slug):
+    row = Product.objects.filter(slug=slug, available=True).values(*PRODUCT_VALUES).first()
+    if row is None:
+        return None
+    return {'row': row, 'discounts': product_discount_rows([row['id']]).get(row['id'], [])}
+
+
+def warm_product_entries(queryset):
+    # Carga en bloque las entradas de detalle: dos consultas en total
+    rows = list(queryset.values(*PRODUCT_VALUES))
+    discounts = product_discount_rows([row['id'] for row in rows])
+    for row in rows:
+        catalogue_cache.set('product', f"slug:{row['slug']}", {
+            'row': row,
+            'discounts': discounts.get(row['id'], []),
+        })
+    return len(rows)
+
+
+def product_entry(slug):
+    return catalogue_cache.get_or_set('product', f'slug:{slug}', lambda: _load_product(slug))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import is_shared_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    alias = getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default')
+    if is_shared_cache(alias):
+        return []
+    return [
+        Warning(
+            f'La caché "{alias}" no es compartida entre procesos',
+            hint='Configure REDIS_URL: las invalidaciones del catálogo y la '
+                 'configuración del perfilado solo llegarían al proceso que las hace.',
+            id='store.W001',
+        )
+    ]
@@ -0,0 +1,85 @@
+import secrets
+
+from django.db import IntegrityError, transaction
+
+from .models import Coupon, CouponCampaign
+
+
+# Sin 0/O ni 1/I para que los códigos se puedan dictar y teclear sin errores
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+DEFAULT_CHUNK_SIZE = 5000
+MAX_CAMPAIGN_CODES = 1000000
+LOOKUP_CHUNK_SIZE = 2000
+# Sorteos seguidos sin poder insertar antes de dar el trabajo por fallido
+MAX_COLLISION_RETRIES = 5
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def random_code(prefix, length):
+    # 32 símbolos: cada byte aleatorio & 31 elige uno con probabilidad uniforme
+    return prefix + ''.join(CODE_ALPHABET[byte & 31] for byte in secrets.token_bytes(length))
+
+
+def existing_codes(codes):
+    # Comprueba colisiones contra el índice único en bloques, no código a código
+    codes = list(codes)
+    found = set()
+    for i in range(0, len(codes), LOOKUP_CHUNK_SIZE):
+        found.update(
+            Coupon.objects.filter(code__in=codes[i:i + LOOKUP_CHUNK_SIZE]).values_list('code', flat=True)
+        )
+    return found
+
+
+def generate_campaign_codes(campaign_id, target_total, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Genera hasta que la campaña tenga target_total cupones: cada bloque se
+    # confirma por separado y un reintento del trabajo solo completa lo que falta
+    created = 0
+    collisions = 0
+    while True:
+        try:
+            with transaction.atomic():
+                # La fila de la campaña bloqueada serializa las generaciones
+                # concurrentes: cada bloque recalcula lo que falta con el
+                # recuento ya confirmado por las demás
+                campaign = CouponCampaign.objects.select_for_update().get(pk=campaign_id)
+                missing = target_total - campaign.coupons.count()
+                if missing <= 0:
+                    return created
+
+                size = min(chunk_size, missing)
+                codes = set()
+                while len(codes) < size:
+                    codes.add(random_code(campaign.code_prefix, campaign.code_length))
+                codes -= existing_codes(codes)
+                if not codes:
+                    # Todos los códigos sorteados existen: el espacio de la campaña está casi agotado
+                    raise IntegrityError(f'No quedan códigos libres para la campaña {campaign_id}')
+
+                coupons = [
+                    Coupon(
+                        code=code,
+                        campaign=campaign,
+                        description=campaign.description,
+                        discount_value=campaign.discount_value,
+                        is_percentage=campaign.is_percentage,
+                        minimum_purchase=campaign.minimum_purchase,
+                        valid_from=campaign.valid_from,
+                        valid_to=campaign.valid_to,
+                        max_uses=1,
+                    )
+                    for code in codes
+                ]
+                Coupon.objects.bulk_create(coupons, batch_size=1000)
+        except IntegrityError:
+            # Otra generación insertó alguno de estos códigos: se descarta el
+            # bloque y se vuelve a sortear, pero no indefinidamente
+            collisions += 1
+            if collisions > MAX_COLLISION_RETRIES:
+                raise
+            continue
+        collisions = 0
+        created += len(coupons)
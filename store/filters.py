@@ -0,0 +1,116 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Case, CharField, Count, Exists, F, OuterRef, Value, When
+from rest_framework.exceptions import ValidationError
+
+from .models import Discount
+
+
+DEFAULT_PRICE_BUCKETS = [0, 25, 50, 100, 250, 500]
+
+TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+
+
+def price_buckets():
+    return getattr(settings, 'PRODUCT_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS)
+
+
+def bucket_label(lower, upper):
+    return f'{lower}-{upper}' if upper is not None else f'{lower}+'
+
+
+def live_discount_exists(now):
+    return Exists(
+        Discount.products.through.objects.filter(
+            product_id=OuterRef('pk'),
+            discount__active=True,
+            discount__start_date__lte=now,
+            discount__end_date__gte=now
+        )
+    )
+
+
+def price_bucket_case():
+    bounds = price_buckets()
+    whens = []
+    for lower, upper in zip(bounds, bounds[1:] + [None]):
+        condition = {'price__gte': lower}
+        if upper is not None:
+            condition['price__lt'] = upper
+        whens.append(When(**condition, then=Value(bucket_label(lower, upper))))
+    return Case(*whens, default=Value(''), output_field=CharField())
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'Debe ser un número'})
+
+
+def filter_products(queryset, params, now, exclude=()):
+    # `exclude` omite los filtros de esas facetas ('category', 'price', 'on_sale')
+    categories = [slug for slug in params.get('category', '').split(',') if slug]
+    if categories and 'category' not in exclude:
+        queryset = queryset.filter(category__slug__in=categories)
+
+    min_price = _decimal_param(params, 'min_price')
+    max_price = _decimal_param(params, 'max_price')
+    if 'price' not in exclude:
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+
+    if params.get('in_stock', '').lower() in TRUE_VALUES:
+        queryset = queryset.filter(stock__gt=F('reserved'))
+
+    on_sale = params.get('on_sale', '').lower()
+    if on_sale and 'on_sale' not in exclude:
+        queryset = queryset.alias(on_sale=live_discount_exists(now)).filter(
+            on_sale=on_sale in TRUE_VALUES
+        )
+    return queryset
+
+
+def product_facets(queryset, params, now):
+    # Cada faceta se cuenta aplicando todos los filtros menos el suyo: con una
+    # categoría elegida siguen apareciendo las demás con los totales que
+    # tendrían al cambiar a ellas. Una consulta GROUP BY por faceta.
+    category_rows = filter_products(queryset, params, now, exclude=['category']).order_by().values(
+        'category__slug', 'category__name'
+    ).annotate(count=Count('pk'))
+    price_rows = filter_products(queryset, params, now, exclude=['price']).order_by().annotate(
+        price_bucket=price_bucket_case()
+    ).values('price_bucket').annotate(count=Count('pk'))
+    sale_rows = filter_products(queryset, params, now, exclude=['on_sale']).order_by().annotate(
+        live_discount=live_discount_exists(now)
+    ).values('live_discount').annotate(count=Count('pk'))
+
+    categories = [
+        {'slug': row['category__slug'], 'name': row['category__name'], 'count': row['count']}
+        for row in category_rows
+    ]
+    buckets = {row['price_bucket']: row['count'] for row in price_rows}
+    sale = {'on_sale': 0, 'regular': 0}
+    for row in sale_rows:
+        sale['on_sale' if row['live_discount'] else 'regular'] += row['count']
+
+    bounds = price_buckets()
+    return {
+        'categories': sorted(categories, key=lambda c: c['name']),
+        'price': [
+            {
+                'range': bucket_label(lower, upper),
+                'min': lower,
+                'max': upper,
+                'count': buckets.get(bucket_label(lower, upper), 0),
+            }
+            for lower, upper in zip(bounds, bounds[1:] + [None])
+        ],
+        'discount': sale,
+    }
@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Product, StockReservation
+from .signals import bump_on_commit
+
+
+DEFAULT_RESERVATION_TTL = timedelta(minutes=15)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+        super().__init__(f'Stock insuficiente para el producto {product_id} (cantidad {quantity})')
+
+
+def reservation_ttl():
+    ttl = getattr(settings, 'STOCK_RESERVATION_TTL', DEFAULT_RESERVATION_TTL)
+    if not isinstance(ttl, timedelta):
+        ttl = timedelta(seconds=ttl)
+    return ttl
+
+
+def reserve_stock(product_id, quantity, cart_item=None):
+    # UPDATE condicional sobre una sola fila: no hay bloqueo de tabla y
+    # dos reservas concurrentes nunca superan el stock disponible
+    with transaction.atomic():
+        updated = Product.objects.filter(
+            pk=product_id,
+            stock__gte=F('reserved') + quantity
+        ).update(reserved=F('reserved') + quantity)
+        if not updated:
+            raise InsufficientStock(product_id, quantity)
+        # .update() no emite post_save: el catálogo cacheado muestra el stock
+        bump_on_commit('product')
+
+        return StockReservation.objects.create(
+            product_id=product_id,
+            cart_item=cart_item,
+            quantity=quantity,
+            expires_at=timezone.now() + reservation_ttl()
+        )
+
+
+def release_reservation(reservation):
+    with transaction.atomic():
+        # Solo quien borra la fila devuelve el stock, así el barrido y una
+        # liberación manual concurrente no lo devuelven dos veces
+        deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+        if deleted:
+            Product.objects.filter(pk=reservation.product_id).update(
+                reserved=F('reserved') - reservation.quantity
+            )
+            bump_on_commit('product')
+        return bool(deleted)
+
+
+def release_cart_item(cart_item):
+    reservation = StockReservation.objects.filter(cart_item=cart_item).first()
+    if reservation is not None:
+        release_reservation(reservation)
+
+
+def decrement_stock(product_id, quantity):
+    updated = Product.objects.filter(
+        pk=product_id,
+        stock__gte=F('reserved') + quantity
+    ).update(stock=F('stock') - quantity)
+    if not updated:
+        raise InsufficientStock(product_id, quantity)
+    bump_on_commit('product')
+
+
+def commit_reservations(reservations):
+    # Se ordena por producto para que dos checkouts concurrentes bloqueen
+    # las filas siempre en el mismo orden
+    reservations = sorted(reservations, key=lambda r: (r.product_id, r.pk))
+    with transaction.atomic():
+        for reservation in reservations:
+            deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+            if not deleted:
+                # La reserva ya expiró y fue liberada: se descuenta del stock libre
+                decrement_stock(reservation.product_id, reservation.quantity)
+                continue
+
+            updated = Product.objects.filter(
+                pk=reservation.product_id,
+                stock__gte=reservation.quantity
+            ).update(
+                stock=F('stock') - reservation.quantity,
+                reserved=F('reserved') - reservation.quantity
+            )
+            if not updated:
+                raise InsufficientStock(reservation.product_id, reservation.quantity)
+        if reservations:
+            bump_on_commit('product')
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = StockReservation.objects.filter(expires_at__lte=now).order_by('pk')
+            if connection.features.has_select_for_update_skip_locked:
+                expired = expired.select_for_update(skip_locked=True)
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            batch = StockReservation.objects.filter(pk__in=ids)
+            totals = batch.values('product_id').annotate(total=Sum('quantity')).order_by('product_id')
+            for row in totals:
+                Product.objects.filter(pk=row['product_id']).update(
+                    reserved=F('reserved') - row['total']
+                )
+            deleted, _ = batch.delete()
+            released += deleted
+            bump_on_commit('product')
+    return released
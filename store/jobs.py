@@ -0,0 +1,138 @@
+import logging
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BACKOFF = 30
+DEFAULT_MAX_BACKOFF = 3600
+DEFAULT_JOB_TIMEOUT = 600
+DEFAULT_REQUEUE_INTERVAL = 60
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(path, run_at=None, max_attempts=None, **kwargs):
+    # El trabajo se inserta en la misma transacción que lo pide: si la
+    # transacción se revierte, el trabajo tampoco existe
+    return Job.objects.create(
+        name=path,
+        payload=kwargs,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or _setting('JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    )
+
+
+def retry_delay(attempts):
+    base = _setting('JOB_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), DEFAULT_MAX_BACKOFF))
+
+
+def requeue_stale_jobs(now=None):
+    # Trabajos de un worker que murió a mitad de ejecución. El intento ya se
+    # contó al reclamarlo: si era el último, el trabajo se da por fallido en
+    # lugar de volver a la cola (un trabajo que tumba al worker no se reintenta
+    # indefinidamente)
+    now = now or timezone.now()
+    timeout = timedelta(seconds=_setting('JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT))
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timeout)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed',
+        locked_by='',
+        locked_at=None,
+        finished_at=now,
+        last_error='El worker no terminó el trabajo antes del tiempo límite'
+    )
+    requeued = stale.update(
+        status='queued',
+        locked_by='',
+        locked_at=None
+    )
+    return requeued + failed
+
+
+def claim_jobs(worker_id, limit=10, now=None):
+    now = now or timezone.now()
+    token = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    with transaction.atomic():
+        pending = Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        ids = list(pending.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        # La condición sobre status evita que dos workers tomen el mismo
+        # trabajo en bases de datos sin SKIP LOCKED
+        Job.objects.filter(pk__in=ids, status='queued').update(
+            status='running',
+            locked_by=token,
+            locked_at=now,
+            attempts=F('attempts') + 1
+        )
+    return list(Job.objects.filter(pk__in=ids, locked_by=token))
+
+
+def run_job(job):
+    started = time.perf_counter()
+    try:
+        import_string(job.name)(**job.payload)
+    except Exception:
+        job.duration_ms = (time.perf_counter() - started) * 1000
+        job.last_error = traceback.format_exc()
+        job.locked_by = ''
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        logger.exception('Fallo el trabajo %s (intento %s/%s)', job.name, job.attempts, job.max_attempts)
+    else:
+        job.duration_ms = (time.perf_counter() - started) * 1000
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        logger.info('Trabajo %s terminado en %.1f ms', job.name, job.duration_ms)
+    job.save(update_fields=[
+        'status', 'run_at', 'locked_by', 'locked_at',
+        'last_error', 'duration_ms', 'finished_at'
+    ])
+    return job.status == 'done'
+
+
+def work(worker_id, batch_size=10):
+    processed = 0
+    for job in claim_jobs(worker_id, limit=batch_size):
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def job_stats(since=None):
+    jobs = Job.objects.all()
+    if since is not None:
+        jobs = jobs.filter(created__gte=since)
+    return list(
+        jobs.values('name').annotate(
+            total=Count('pk'),
+            done=Count('pk', filter=Q(status='done')),
+            failed=Count('pk', filter=Q(status='failed')),
+            pending=Count('pk', filter=Q(status__in=['queued', 'running'])),
+            avg_ms=Avg('duration_ms'),
+            max_ms=Max('duration_ms'),
+        ).order_by('name')
+    )
@@ -0,0 +1,87 @@
+from contextvars import ContextVar
+
+from .models import Discount
+
+
+_current = ContextVar('store_identity_map', default=None)
+
+
+# Mapa de identidad por petición: cada fila se carga una sola vez y todas las
+# búsquedas por clave primaria devuelven la misma instancia en memoria. Las
+# cargas se agrupan en consultas IN (...) en lugar de una consulta por fila.
+class IdentityMap:
+    def __init__(self):
+        self._objects = {}
+        self._relations = {}
+
+    def _key(self, model, pk):
+        return (model._meta.label, pk)
+
+    def add(self, obj):
+        return self._objects.setdefault(self._key(type(obj), obj.pk), obj)
+
+    def get_many(self, model, pks):
+        pks = set(pks)
+        missing = [pk for pk in pks if self._key(model, pk) not in self._objects]
+        if missing:
+            found = model._default_manager.in_bulk(missing)
+            for pk in missing:
+                self._objects[self._key(model, pk)] = found.get(pk)
+        return {
+            pk: self._objects[self._key(model, pk)]
+            for pk in pks
+            if self._objects[self._key(model, pk)] is not None
+        }
+
+    def get(self, model, pk):
+        return self.get_many(model, [pk]).get(pk)
+
+    def load_related(self, instances, field_name):
+        # Rellena la caché de la FK `field_name` de todas las instancias con
+        # una sola consulta, reutilizando las filas ya cargadas
+        instances = [i for i in instances if i is not None]
+        if not instances:
+            return []
+        field = instances[0]._meta.get_field(field_name)
+        pending = [i for i in instances if not field.is_cached(i)]
+        related = self.get_many(field.related_model, {getattr(i, field.attname) for i in pending})
+        for instance in pending:
+            obj = related.get(getattr(instance, field.attname))
+            if obj is not None:
+                setattr(instance, field_name, obj)
+        return [getattr(i, field_name) for i in instances if field.is_cached(i)]
+
+    def active_discounts(self, product):
+        discounts = self._relations.get(('active_discounts', product.pk))
+        if discounts is None:
+            self.load_active_discounts([product])
+            discounts = self._relations[('active_discounts', product.pk)]
+        return discounts
+
+    def load_active_discounts(self, products):
+        pending = {p.pk for p in products if ('active_discounts', p.pk) not in self._relations}
+        if not pending:
+            return
+        for pk in pending:
+            self._relations[('active_discounts', pk)] = []
+        links = Discount.products.through.objects.filter(
+            product_id__in=pending,
+            discount__active=True
+        ).select_related('discount').order_by('pk')
+        for link in links:
+            discount = self.add(link.discount)
+            self._relations[('active_discounts', link.product_id)].append(discount)
+
+
+def current_identity_map():
+    # Fuera de una petición (shell, comandos) cada llamada usa un mapa nuevo
+    identity_map = _current.get()
+    return identity_map if identity_map is not None else IdentityMap()
+
+
+def activate_identity_map():
+    return _current.set(IdentityMap())
+
+
+def deactivate_identity_map(token):
+    _current.reset(token)
@@ -0,0 +1,69 @@
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from store.cache import catalogue_cache
+from store.models import Category, Discount, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    # Todo lo escrito dentro del bloque se revierte al salir
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+    finally:
+        # La caché pudo llenarse con filas que ya no existen
+        catalogue_cache.bump('category')
+        catalogue_cache.bump('product')
+
+
+def create_catalogue(rows):
+    now = timezone.now()
+    categories = [Category.objects.create(name=f'Bench {i}', slug=f'bench-{i}') for i in range(10)]
+    products = Product.objects.bulk_create([
+        Product(
+            category=categories[i % len(categories)],
+            name=f'Bench product {i}',
+            slug=f'bench-product-{i}',
+            description='Lorem ipsum dolor sit amet ' * 10,
+            price=f'{(i % 500) + 0.99:.2f}',
+            stock=i % 20,
+        )
+        for i in range(rows)
+    ])
+    discount = Discount.objects.create(
+        name='Bench', discount_type='percentage', value=15,
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1)
+    )
+    discount.products.add(*products[::3])
+    return products
+
+
+def bench_request(path='/api/products/', **extra):
+    host = next((h for h in settings.ALLOWED_HOSTS if '*' not in h and not h.startswith('.')), 'localhost')
+    return RequestFactory().get(path, HTTP_HOST=host, **extra)
+
+
+def best_of(func, repeat):
+    # Devuelve el resultado y el mejor tiempo en ms
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+
+from store.reports import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los agregados de ventas y cupones desde las filas crudas, por tramos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Fecha inicial (AAAA-MM-DD); por defecto la primera orden')
+        parser.add_argument('--chunk-days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        start = None
+        if options['since']:
+            day = parse_date(options['since'])
+            if day is None:
+                raise CommandError('--since debe tener el formato AAAA-MM-DD')
+            start = timezone.make_aware(timezone.datetime(day.year, day.month, day.day))
+        chunks = backfill_rollups(start, chunk=timedelta(days=options['chunk_days']))
+        self.stdout.write(self.style.SUCCESS(f'{chunks} tramos reconstruidos'))
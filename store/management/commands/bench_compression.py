@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+
+from store.middleware import CompressionMiddleware, brotli
+from store.models import Product
+from store.renderers import FastJSONRenderer
+from store.serializers import fast_product_data
+
+from ._bench import bench_request, best_of, create_catalogue, rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Mide bytes transferidos y coste de CPU de la compresión para /api/products/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=0,
+                            help='Crea N productos temporales (se revierten al terminar)')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if options['rows']:
+                create_catalogue(options['rows'])
+            request = bench_request()
+            data = fast_product_data(Product.objects.filter(available=True), request)
+            body = FastJSONRenderer().render(data)
+
+        self.stdout.write(f'/api/products/: {len(data)} productos, {len(body)} bytes sin comprimir')
+        encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+        for encoding in encodings:
+            middleware = CompressionMiddleware(lambda request: None)
+            request = bench_request(HTTP_ACCEPT_ENCODING=encoding)
+
+            def compress():
+                response = HttpResponse(body, content_type='application/json')
+                return middleware.process_response(request, response)
+
+            response, elapsed = best_of(compress, options['repeat'])
+            size = len(response.content)
+            self.stdout.write(
+                f'{encoding:>8}: {size} bytes ({size / len(body):.1%}), {elapsed:.2f} ms de CPU'
+            )
+        if brotli is None:
+            self.stdout.write('brotli no está instalado: solo se ofrece gzip')
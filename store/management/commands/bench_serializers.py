@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from store.models import Category, Product
+from store.renderers import FastJSONRenderer
+from store.serializers import (
+    CategorySerializer, ProductSerializer, fast_category_data, fast_product_data
+)
+
+from ._bench import bench_request, best_of, create_catalogue, rolled_back
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la serialización rápida del catálogo con los serializers de DRF: '
+        'verifica que la salida sea idéntica campo por campo y mide el tiempo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=0,
+                            help='Crea N productos temporales (se revierten al terminar)')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if options['rows']:
+                create_catalogue(options['rows'])
+            self.run(options['repeat'])
+
+    def run(self, repeat):
+        request = bench_request()
+        now = timezone.now()
+        products = Product.objects.filter(available=True).prefetch_related('discounts')
+        categories = Category.objects.all()
+
+        cases = [
+            (
+                'categorías',
+                lambda: CategorySerializer(categories, many=True, context={'request': request}).data,
+                lambda: fast_category_data(categories, request),
+            ),
+            (
+                'productos',
+                lambda: ProductSerializer(products, many=True, context={'request': request}).data,
+                lambda: fast_product_data(products, request, now=now),
+            ),
+        ]
+        for label, drf, fast in cases:
+            expected, drf_ms = best_of(drf, repeat)
+            actual, fast_ms = best_of(fast, repeat)
+            expected = JSONRenderer().render(expected)
+            actual_bytes = FastJSONRenderer().render(actual)
+            if JSONRenderer().render(actual) != expected:
+                raise CommandError(f'La salida rápida de {label} difiere de la de DRF')
+            if actual_bytes != expected:
+                self.stdout.write(self.style.WARNING(
+                    f'{label}: el renderer rápido produce bytes distintos (mismo contenido JSON)'
+                ))
+
+            _, json_ms = best_of(lambda: JSONRenderer().render(actual), repeat)
+            _, fast_json_ms = best_of(lambda: FastJSONRenderer().render(actual), repeat)
+            self.stdout.write(
+                f'{label} ({len(actual)} filas): DRF {drf_ms:.1f} ms, rápido {fast_ms:.1f} ms '
+                f'(x{drf_ms / max(fast_ms, 1e-6):.1f}); JSON {json_ms:.1f} ms, '
+                f'JSON rápido {fast_json_ms:.1f} ms'
+            )
+        self.stdout.write(self.style.SUCCESS('Salidas idénticas campo por campo'))
@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Se ejecuta en un proceso nuevo para medir un arranque realmente en frío
+BOOT_SCRIPT = '''
+import json, os, sys, time
+started = time.perf_counter()
+import django
+from django.conf import settings
+django.setup()
+setup_ms = (time.perf_counter() - started) * 1000
+
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+app_ms = (time.perf_counter() - started) * 1000
+
+warmup_ms = 0.0
+if os.environ.get('BENCH_WARMUP') == '1':
+    from store.warmup import warmup
+    t = time.perf_counter()
+    warmup()
+    warmup_ms = (time.perf_counter() - t) * 1000
+
+from django.test import Client
+client = Client(HTTP_HOST=os.environ['BENCH_HOST'])
+first = {}
+for path in ['/api/categories/', '/api/products/']:
+    t = time.perf_counter()
+    client.get(path)
+    first[path] = (time.perf_counter() - t) * 1000
+
+print(json.dumps({
+    'setup_ms': setup_ms,
+    'app_ms': app_ms,
+    'warmup_ms': warmup_ms,
+    'first_request_ms': first,
+    'requests_imported': 'requests' in sys.modules,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de arranque de un worker y de sus primeras peticiones, con y sin precalentamiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+
+    def boot(self, warm):
+        host = next((h for h in settings.ALLOWED_HOSTS if '*' not in h and not h.startswith('.')), 'localhost')
+        env = dict(
+            os.environ,
+            BENCH_WARMUP='1' if warm else '0',
+            BENCH_HOST=host,
+            DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings'),
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', BOOT_SCRIPT],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for warm in (False, True):
+            results = [self.boot(warm) for _ in range(options['runs'])]
+            best = min(results, key=lambda r: r['app_ms'] + r['warmup_ms'])
+            first = ', '.join(f'{path} {ms:.1f} ms' for path, ms in best['first_request_ms'].items())
+            self.stdout.write(
+                f"{'con' if warm else 'sin'} precalentamiento: django.setup {best['setup_ms']:.1f} ms, "
+                f"aplicación lista {best['app_ms']:.1f} ms, warmup {best['warmup_ms']:.1f} ms; "
+                f"primeras peticiones: {first}; requests importado: {best['requests_imported']}"
+            )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import build_recommendations, np
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de productos "comprados juntos" a partir de las órdenes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None)
+        parser.add_argument('--min-support', type=int, default=None,
+                            help='Número mínimo de órdenes compartidas para relacionar dos productos')
+
+    def handle(self, *args, **options):
+        if np is None:
+            self.stdout.write(self.style.WARNING('numpy/scipy no están instalados: se usa la versión en Python puro'))
+        products = build_recommendations(options['top_k'], options['min_support'])
+        self.stdout.write(self.style.SUCCESS(f'Recomendaciones calculadas para {products} productos'))
@@ -0,0 +1,46 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.bulk import DEFAULT_CHUNK_SIZE, FIELDS, OPERATIONS, BulkUpdateError, bulk_update_products, select_products
+
+
+class Command(BaseCommand):
+    help = 'Actualiza precio o stock de muchos productos con UPDATE por bloques'
+
+    def add_arguments(self, parser):
+        parser.add_argument('field', choices=FIELDS)
+        parser.add_argument('operation', choices=OPERATIONS)
+        parser.add_argument('value', nargs='?', help='Valor, cantidad o porcentaje según la operación')
+        parser.add_argument('--category', action='append', default=[], help='Slug de categoría (repetible)')
+        parser.add_argument('--discount', type=int)
+        parser.add_argument('--slug', action='append', default=[], help='Slug de producto (repetible)')
+        parser.add_argument('--round-99', action='store_true', help='Redondea el precio resultante a .99')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        value = options['value']
+        if value is not None:
+            try:
+                value = Decimal(value)
+            except InvalidOperation:
+                raise CommandError('El valor debe ser un número')
+        try:
+            queryset = select_products(
+                categories=options['category'],
+                discount=options['discount'],
+                slugs=options['slug']
+            )
+            result = bulk_update_products(
+                queryset,
+                options['field'],
+                options['operation'],
+                value=value,
+                round_99=options['round_99'],
+                chunk_size=options['chunk_size']
+            )
+        except BulkUpdateError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['updated']} productos actualizados en {result['chunks']} bloques"
+        ))
@@ -0,0 +1,34 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from store.profiling import LOCAL_CACHE_WARNING, list_samples, render_collapsed, shared_storage
+
+
+class Command(BaseCommand):
+    help = 'Exporta las muestras de perfilado guardadas (.pstats o .folded para flamegraph)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directorio de destino')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not shared_storage():
+            # Este proceso no ve las muestras guardadas por los workers
+            self.stderr.write(self.style.WARNING(LOCAL_CACHE_WARNING))
+        os.makedirs(directory, exist_ok=True)
+        samples = list_samples()
+        for sample in samples:
+            if 'pstats' in sample:
+                filename = os.path.join(directory, f"profile-{sample['id']}.pstats")
+                with open(filename, 'wb') as f:
+                    f.write(sample['pstats'])
+            else:
+                filename = os.path.join(directory, f"profile-{sample['id']}.folded")
+                with open(filename, 'w') as f:
+                    f.write(render_collapsed(sample))
+            self.stdout.write(
+                f"{filename}: {sample['method']} {sample['path']} "
+                f"{sample['status']} {sample['duration_ms']:.1f} ms"
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(samples)} muestras exportadas'))
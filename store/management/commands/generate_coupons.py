@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.coupons import DEFAULT_CHUNK_SIZE, generate_campaign_codes
+from store.models import CouponCampaign
+
+
+class Command(BaseCommand):
+    help = 'Genera cupones de un solo uso para una campaña'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int)
+        parser.add_argument('count', type=int)
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        campaign = CouponCampaign.objects.filter(pk=options['campaign_id']).first()
+        if campaign is None:
+            raise CommandError('La campaña no existe')
+        created = generate_campaign_codes(
+            campaign.pk, campaign.coupons.count() + options['count'], chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'{created} cupones generados'))
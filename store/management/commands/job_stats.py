@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.jobs import job_stats
+
+
+class Command(BaseCommand):
+    help = 'Muestra métricas de tiempo y estado de los trabajos en segundo plano'
+
+    def handle(self, *args, **options):
+        for row in job_stats():
+            avg_ms = row['avg_ms'] or 0
+            max_ms = row['max_ms'] or 0
+            self.stdout.write(
+                f"{row['name']}: {row['total']} total, {row['done']} ok, "
+                f"{row['failed']} fallidos, {row['pending']} pendientes, "
+                f"{avg_ms:.1f} ms prom., {max_ms:.1f} ms máx."
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.popularity import refresh_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el ranking de productos populares a partir de los contadores diarios'
+
+    def handle(self, *args, **options):
+        ranked = refresh_popularity()
+        self.stdout.write(self.style.SUCCESS(f'{ranked} productos en el ranking'))
@@ -0,0 +1,42 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from store.payments import ingest_event, process_payment_events
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'fixtures', 'paypal')
+
+
+class Command(BaseCommand):
+    help = (
+        'Reinyecta eventos de webhook de PayPal grabados (sin verificar la firma). '
+        'Por defecto usa store/fixtures/paypal'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Ficheros JSON o directorios con eventos')
+        parser.add_argument('--process', action='store_true', help='Procesa los eventos sin esperar al worker')
+
+    def handle(self, *args, **options):
+        files = []
+        for path in options['paths'] or [os.path.normpath(FIXTURES_DIR)]:
+            if os.path.isdir(path):
+                files.extend(sorted(
+                    os.path.join(path, name) for name in os.listdir(path) if name.endswith('.json')
+                ))
+            else:
+                files.append(path)
+
+        for filename in files:
+            with open(filename) as f:
+                event, created = ingest_event(json.load(f))
+            self.stdout.write(
+                f"{os.path.basename(filename)}: {event.event_type} {event.payment_id} "
+                f"({'nuevo' if created else 'duplicado'})"
+            )
+
+        if options['process']:
+            processed = process_payment_events()
+            self.stdout.write(self.style.SUCCESS(f'{processed} eventos procesados'))
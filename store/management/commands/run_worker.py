@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from store.jobs import DEFAULT_REQUEUE_INTERVAL, requeue_stale_jobs, work
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos en segundo plano encolados en la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--once', action='store_true',
+                            help='Vacía la cola y termina')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        if processes == 1:
+            self.loop(options)
+            return
+
+        # Cada proceso debe abrir su propia conexión
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=self.loop, args=(options,))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        # El gestor de procesos solo envía SIGTERM al padre: se reenvía a los
+        # hijos para que terminen el lote en curso en lugar de quedar huérfanos
+        def forward(signum, frame):
+            for worker in workers:
+                worker.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+
+    def loop(self, options):
+        worker_id = f'{os.uname().nodename}:{os.getpid()}'
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        self.stdout.write(f'Worker {worker_id} iniciado')
+
+        interval = getattr(settings, 'JOB_REQUEUE_INTERVAL', DEFAULT_REQUEUE_INTERVAL)
+        last_requeue = None
+        while not stopping:
+            close_old_connections()
+            if last_requeue is None or time.monotonic() - last_requeue >= interval:
+                requeue_stale_jobs()
+                last_requeue = time.monotonic()
+            processed = work(worker_id, batch_size=options['batch_size'])
+            if not processed:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
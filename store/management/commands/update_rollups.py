@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.reports import update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Actualiza los agregados por hora y por día desde la última ejecución (ejecutar periódicamente)'
+
+    def handle(self, *args, **options):
+        start = update_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Agregados actualizados desde {start:%Y-%m-%d %H:%M}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from store.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = 'Precalienta la caché del catálogo (categorías y productos recientes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=None,
+                            help='Número de productos a cargar (por defecto STORE_WARMUP_PRODUCTS)')
+
+    def handle(self, *args, **options):
+        timings = warmup(options['products'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Precalentado: {timings['products']} productos; serializers "
+            f"{timings['serializers']:.1f} ms, conexión {timings['connection']:.1f} ms, "
+            f"catálogo {timings['catalogue']:.1f} ms"
+        ))
@@ -0,0 +1,180 @@
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .loaders import activate_identity_map, deactivate_identity_map
+from .profiling import get_config, profile_call, should_profile, store_sample
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_MIN_SIZE = 1024
+
+
+def accepted_encodings(header):
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[coding] = quality
+    return encodings
+
+
+class GzipCompressor:
+    encoding = 'gzip'
+
+    def __init__(self, level):
+        # wbits=31 genera el formato gzip (cabecera y CRC incluidos)
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    encoding = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+# Comprime las respuestas con Brotli (si está instalado) o gzip según
+# Accept-Encoding. Solo se comprimen los tipos de COMPRESSION_CONTENT_TYPES;
+# las respuestas por debajo de COMPRESSION_MIN_SIZE se envían tal cual y las
+# respuestas en streaming se comprimen fragmento a fragmento.
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+        # La lista completa vive en settings.COMPRESSION_CONTENT_TYPES
+        self.content_types = set(getattr(settings, 'COMPRESSION_CONTENT_TYPES', ['application/json']))
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def get_compressor(self, request):
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and encodings.get('br', 0) > 0:
+            return BrotliCompressor(self.brotli_quality)
+        if encodings.get('gzip', 0) > 0:
+            return GzipCompressor(self.gzip_level)
+        return None
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressor = self.get_compressor(request)
+        if compressor is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async(compressor, response.streaming_content)
+            else:
+                response.streaming_content = self.compress_stream(compressor, response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # El ETag fuerte deja de ser válido para el cuerpo comprimido
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = compressor.encoding
+        return response
+
+    @staticmethod
+    def compress_stream(compressor, chunks):
+        # Se vacía el compresor en cada fragmento para que cada línea NDJSON
+        # llegue al cliente sin esperar al final de la respuesta
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def compress_async(compressor, chunks):
+        async for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+# Activa un mapa de identidad nuevo (store.loaders) durante cada petición
+class IdentityMapMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = activate_identity_map()
+        try:
+            return self.get_response(request)
+        finally:
+            deactivate_identity_map(token)
+
+
+# Perfilado bajo demanda (store.profiling): solo se perfilan las peticiones
+# muestreadas en las rutas activadas o las de staff con X-Profile: 1. El resto
+# pasa directamente a la vista sin coste añadido.
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+
+        mode = get_config()['mode']
+        started = time.perf_counter()
+        response, data = profile_call(lambda: self.get_response(request), mode)
+        if data is None:
+            return response
+        duration_ms = (time.perf_counter() - started) * 1000
+        sample_id = store_sample(request, response, duration_ms, mode, data)
+        response['X-Profile-Id'] = str(sample_id)
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularProduct',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='store.product')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveIntegerField(db_index=True)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('cart_adds', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='store_produ_day_54a437_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_related_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hora'), ('day', 'Día')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('order_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('coupon_discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['period', 'bucket'],
+                'unique_together': {('period', 'bucket')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CouponRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hora'), ('day', 'Día')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('uses', models.PositiveIntegerField(default=0)),
+                ('order_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='store.coupon')),
+            ],
+            options={
+                'ordering': ['coupon', 'period', 'bucket'],
+                'indexes': [models.Index(fields=['period', 'bucket'], name='store_coupo_period_1060f8_idx')],
+                'unique_together': {('coupon', 'period', 'bucket')},
+            },
+        ),
+    ]
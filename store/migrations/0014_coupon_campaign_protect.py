@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_rollup_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coupon',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='coupons', to='store.couponcampaign'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils.text import slugify
 from decimal import Decimal
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Category(models.Model):
@@ -31,6 +32,7 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
+    reserved = models.IntegerField(default=0)
     available = models.BooleanField(default=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -41,6 +43,10 @@ class Product(models.Model):
             self.slug = slugify(self.name)
         super(Product, self).save(*args, **kwargs)
     
+    @property
+    def available_stock(self):
+        return self.stock - self.reserved
+
     def __str__(self):
         return self.name
     
@@ -49,11 +55,33 @@ class Product(models.Model):
 
 class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Sin usuario: carrito de un visitante anónimo
+    user = models.ForeignKey(User, related_name='cart_items', on_delete=models.CASCADE, null=True, blank=True)
     quantity = models.IntegerField(default=1)
     created = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f'{self.quantity} x {self.product.name}'
+
+class StockReservation(models.Model):
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    # SET_NULL para que el barrido libere igualmente el stock si el item desaparece
+    cart_item = models.OneToOneField(
+        CartItem,
+        related_name='reservation',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} hasta {self.expires_at}'
     
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -94,15 +122,15 @@ class Discount(models.Model):
         blank=True
     )
 
-    def is_valid(self):
-        now = timezone.now()
+    def is_valid(self, now=None):
+        now = now or timezone.now()
         return (
             self.active and 
             self.start_date <= now <= self.end_date
         )
 
-    def calculate_discount(self, original_price):
-        if not self.is_valid():
+    def calculate_discount(self, original_price, now=None):
+        if not self.is_valid(now):
             return Decimal('0')
             
         original_price = Decimal(str(original_price))
@@ -114,8 +142,47 @@ class Discount(models.Model):
     def __str__(self):
         return f"{self.name} - {self.value}{'%' if self.discount_type == 'percentage' else '$'}"
 
+class CouponCampaign(models.Model):
+    # Plantilla para generar cupones de un solo uso en bloque (store.coupons)
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True)
+    code_prefix = models.CharField(max_length=10, blank=True)
+    code_length = models.PositiveSmallIntegerField(
+        default=10,
+        validators=[MinValueValidator(6), MaxValueValidator(30)]
+    )
+    discount_value = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    is_percentage = models.BooleanField(default=True)
+    minimum_purchase = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0
+    )
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        self.code_prefix = self.code_prefix.strip().upper()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
 class Coupon(models.Model):
     code = models.CharField(max_length=50, unique=True)
+    campaign = models.ForeignKey(
+        CouponCampaign,
+        related_name='coupons',
+        # Borrar una campaña no debe arrastrar los cupones ni su historial de uso
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True
+    )
     description = models.TextField(blank=True)
     discount_value = models.DecimalField(
         max_digits=5,
@@ -140,8 +207,8 @@ class Coupon(models.Model):
         self.code = self.code.strip().upper()
         super().save(*args, **kwargs)
 
-    def calculate_discount(self, cart_total):
-        if not self.is_valid(cart_total):
+    def calculate_discount(self, cart_total, now=None):
+        if not self.is_valid(cart_total, now):
             return Decimal('0')
             
         cart_total = Decimal(str(cart_total))
@@ -150,8 +217,8 @@ class Coupon(models.Model):
             return (cart_total * self.discount_value / Decimal('100')).quantize(Decimal('0.01'))
         return min(self.discount_value, cart_total)
 
-    def is_valid(self, cart_total=None):
-        now = timezone.now()
+    def is_valid(self, cart_total=None, now=None):
+        now = now or timezone.now()
         
         if not self.active or now < self.valid_from or now > self.valid_to:
             return False
@@ -176,3 +243,215 @@ class CouponUsage(models.Model):
 
     class Meta:
         unique_together = ['coupon', 'user']
+
+class Order(models.Model):
+    STATUS_CHOICES = [
+        ('paid', 'Pagado'),
+        ('cancelled', 'Cancelado'),
+    ]
+
+    # ID de la orden en la pasarela de pago: clave de idempotencia
+    payment_id = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, related_name='orders', on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='paid')
+    coupon = models.ForeignKey(Coupon, related_name='orders', on_delete=models.SET_NULL, null=True, blank=True)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    coupon_discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Orden {self.pk} ({self.payment_id})'
+
+    class Meta:
+        ordering = ['-created']
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='order_lines', on_delete=models.SET_NULL, null=True)
+    # Copia de los datos del producto al momento de la compra
+    product_name = models.CharField(max_length=200)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    final_price = models.DecimalField(max_digits=10, decimal_places=2)
+    line_total = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_name}'
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'En cola'),
+        ('running', 'En ejecución'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+
+    # Ruta importable de la función a ejecutar, p. ej. 'store.tasks.send_order_confirmation'
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    duration_ms = models.FloatField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+class ProductActivity(models.Model):
+    # Contadores diarios por producto; se incrementan por lotes desde store.popularity
+    product = models.ForeignKey(Product, related_name='activity', on_delete=models.CASCADE)
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    cart_adds = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.product_id} {self.day}: {self.views} vistas, {self.cart_adds} al carrito'
+
+    class Meta:
+        unique_together = ['product', 'day']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+class PopularProduct(models.Model):
+    # Ranking precalculado; se reconstruye con `manage.py refresh_popularity`
+    product = models.OneToOneField(Product, related_name='popularity', on_delete=models.CASCADE, primary_key=True)
+    score = models.FloatField()
+    rank = models.PositiveIntegerField(db_index=True)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'#{self.rank} {self.product_id} ({self.score:.2f})'
+
+    class Meta:
+        ordering = ['rank']
+
+class RelatedProduct(models.Model):
+    # Vecinos "comprados juntos" precalculados por `manage.py build_recommendations`
+    product = models.ForeignKey(Product, related_name='related_products', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='related_from', on_delete=models.CASCADE)
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id} (#{self.rank})'
+
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'rank']
+
+class SalesRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('hour', 'Hora'),
+        ('day', 'Día'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    orders = models.PositiveIntegerField(default=0)
+    order_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    coupon_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.period} {self.bucket}: {self.orders} órdenes'
+
+    class Meta:
+        ordering = ['period', 'bucket']
+        unique_together = ['period', 'bucket']
+
+class RollupCheckpoint(models.Model):
+    # Hasta dónde llegó la última ejecución de store.reports.update_rollups
+    name = models.CharField(max_length=50, unique=True)
+    rolled_up_to = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name}: {self.rolled_up_to}'
+
+class CouponRollup(models.Model):
+    coupon = models.ForeignKey(Coupon, related_name='rollups', on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=SalesRollup.PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    uses = models.PositiveIntegerField(default=0)
+    order_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.coupon_id} {self.period} {self.bucket}: {self.uses} usos'
+
+    class Meta:
+        ordering = ['coupon', 'period', 'bucket']
+        unique_together = ['coupon', 'period', 'bucket']
+        indexes = [
+            models.Index(fields=['period', 'bucket']),
+        ]
+
+class PendingPayment(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('completed', 'Completado'),
+        ('failed', 'Fallido'),
+    ]
+
+    # El cliente registra el carrito con el ID de la orden de PayPal antes de
+    # capturar el pago; el webhook completa la orden a partir de estos datos
+    payment_id = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, related_name='pending_payments', on_delete=models.SET_NULL, null=True, blank=True)
+    cart_items = models.JSONField(default=list)
+    coupon_code = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    order = models.ForeignKey(Order, related_name='pending_payments', on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.payment_id} ({self.status})'
+
+class PaymentEvent(models.Model):
+    STATUS_CHOICES = [
+        ('received', 'Recibido'),
+        ('processing', 'Procesando'),
+        ('processed', 'Procesado'),
+        ('ignored', 'Ignorado'),
+        ('failed', 'Fallido'),
+    ]
+
+    # ID del evento en PayPal: las entregas repetidas se descartan
+    event_id = models.CharField(max_length=64, unique=True)
+    event_type = models.CharField(max_length=100)
+    payment_id = models.CharField(max_length=64, blank=True, db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='received')
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.event_type} {self.event_id} ({self.status})'
+
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
@@ -0,0 +1,139 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from .inventory import commit_reservations, decrement_stock
+from .jobs import enqueue
+from .models import CartItem, Coupon, CouponUsage, Order, OrderLine, StockReservation
+from .pricing import price_cart
+
+
+DEFAULT_CURRENCY = 'USD'
+
+
+class OrderError(Exception):
+    pass
+
+
+def store_currency():
+    return getattr(settings, 'STORE_CURRENCY', DEFAULT_CURRENCY)
+
+
+def paypal_amount(purchase_units):
+    # Importe total y moneda de las purchase_units de una orden de PayPal
+    total = Decimal('0')
+    currencies = set()
+    try:
+        for unit in purchase_units or []:
+            total += Decimal(unit['amount']['value'])
+            currencies.add(unit['amount']['currency_code'])
+    except (KeyError, TypeError, InvalidOperation):
+        raise OrderError('La orden de PayPal no indica el importe')
+    if len(currencies) != 1:
+        raise OrderError('La orden de PayPal no indica el importe')
+    return total, currencies.pop()
+
+
+def cart_items_for(user):
+    # Un usuario solo puede comprar lo de su carrito; los anónimos, solo
+    # artículos sin dueño
+    if user is None:
+        return CartItem.objects.filter(user__isnull=True)
+    return CartItem.objects.filter(user=user)
+
+
+def place_order(payment_id, cart_item_ids, user=None, coupon_code=None, paid_amount=None, currency=None):
+    # Devuelve (orden, creada). Reintentar con el mismo payment_id devuelve la
+    # orden ya registrada sin repetir ninguna escritura. Si se indica el
+    # importe cobrado, debe coincidir con el total calculado en el servidor.
+    existing = Order.objects.filter(payment_id=payment_id).first()
+    if existing is not None:
+        return existing, False
+
+    cart_items = list(cart_items_for(user).filter(pk__in=cart_item_ids))
+    if not cart_items:
+        raise OrderError('El carrito está vacío')
+
+    with transaction.atomic():
+        # El cupón se bloquea antes de validarlo: dos pedidos concurrentes con el
+        # mismo cupón se serializan y el segundo ve los usos del primero
+        if coupon_code:
+            list(Coupon.objects.select_for_update().filter(code=coupon_code.strip().upper()))
+        quote = price_cart(
+            [(item.product_id, item.quantity) for item in cart_items],
+            coupon_code=coupon_code,
+            user=user
+        )
+        if coupon_code and quote['coupon'] is None:
+            raise OrderError(quote['coupon_error'])
+        if paid_amount is not None:
+            if currency is not None and currency != store_currency():
+                raise OrderError(f'Moneda del pago no válida: {currency}')
+            if Decimal(paid_amount) != quote['total']:
+                raise OrderError(
+                    f"El importe pagado ({paid_amount}) no coincide con el total de la orden ({quote['total']})"
+                )
+
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    payment_id=payment_id,
+                    user=user,
+                    coupon=quote['coupon'],
+                    subtotal=quote['subtotal'],
+                    discount_total=quote['discount_total'],
+                    coupon_discount=quote['coupon_discount'],
+                    total=quote['total']
+                )
+        except IntegrityError:
+            # Otra petición registró la misma orden de forma concurrente
+            return Order.objects.get(payment_id=payment_id), False
+
+        OrderLine.objects.bulk_create([
+            OrderLine(
+                order=order,
+                product=line['product'],
+                product_name=line['product'].name,
+                quantity=line['quantity'],
+                unit_price=line['unit_price'],
+                discount_amount=line['discount_amount'],
+                final_price=line['final_price'],
+                line_total=line['line_total']
+            )
+            for line in quote['lines']
+        ])
+
+        reservations = list(StockReservation.objects.filter(cart_item__in=cart_items))
+        commit_reservations(reservations)
+        reserved_items = {reservation.cart_item_id for reservation in reservations}
+        for item in cart_items:
+            if item.pk not in reserved_items:
+                decrement_stock(item.product_id, item.quantity)
+
+        coupon = quote['coupon']
+        if coupon is not None:
+            used = Coupon.objects.filter(pk=coupon.pk).filter(
+                Q(max_uses__isnull=True) | Q(max_uses=0) | Q(current_uses__lt=F('max_uses'))
+            ).update(current_uses=F('current_uses') + 1)
+            if not used:
+                raise OrderError('El cupón ha alcanzado el límite de usos')
+            if user is not None:
+                try:
+                    with transaction.atomic():
+                        CouponUsage.objects.create(
+                            coupon=coupon,
+                            user=user,
+                            order_total=quote['total'],
+                            discount_amount=quote['coupon_discount']
+                        )
+                except IntegrityError:
+                    raise OrderError('El cupón ya fue utilizado')
+
+        CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+
+        enqueue('store.tasks.send_order_confirmation', order_id=order.pk)
+        enqueue('store.tasks.notify_order_webhooks', order_id=order.pk)
+
+    return order, True
@@ -0,0 +1,371 @@
+import base64
+import json
+import logging
+import traceback
+import uuid
+import zlib
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .inventory import InsufficientStock
+from .jobs import DEFAULT_JOB_TIMEOUT, enqueue, retry_delay
+from .models import Job, Order, PaymentEvent, PendingPayment
+from .orders import OrderError, paypal_amount, place_order
+from .pricing import PricingError
+
+try:
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+except ImportError:
+    x509 = None
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://api-m.sandbox.paypal.com'
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+CERT_CACHE_TTL = 86400
+PROCESS_TASK = 'store.payments.process_payment_events'
+
+COMPLETED_EVENTS = {'CHECKOUT.ORDER.COMPLETED', 'PAYMENT.CAPTURE.COMPLETED'}
+FAILED_EVENTS = {'PAYMENT.CAPTURE.DENIED', 'CHECKOUT.PAYMENT-APPROVAL.REVERSED'}
+
+
+class WebhookError(Exception):
+    pass
+
+
+class PaymentNotReady(Exception):
+    pass
+
+
+class CheckoutConflict(Exception):
+    pass
+
+
+def api_url():
+    return getattr(settings, 'PAYPAL_API_URL', DEFAULT_API_URL)
+
+
+def paypal_access_token():
+    token = cache.get('paypal:access_token')
+    if token is not None:
+        return token
+    import requests
+
+    response = requests.post(
+        f'{api_url()}/v1/oauth2/token',
+        auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET_KEY),
+        data={'grant_type': 'client_credentials'},
+        timeout=10
+    )
+    response.raise_for_status()
+    data = response.json()
+    cache.set('paypal:access_token', data['access_token'], max(data.get('expires_in', 0) - 60, 60))
+    return data['access_token']
+
+
+def _certificate(url):
+    key = f'paypal:cert:{url}'
+    pem = cache.get(key)
+    if pem is None:
+        import requests
+
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        pem = response.content
+        cache.set(key, pem, CERT_CACHE_TTL)
+    return x509.load_pem_x509_certificate(pem)
+
+
+def verify_signature(headers, body):
+    webhook_id = getattr(settings, 'PAYPAL_WEBHOOK_ID', '')
+    if not webhook_id:
+        raise WebhookError('PAYPAL_WEBHOOK_ID no está configurado')
+    try:
+        transmission_id = headers['PAYPAL-TRANSMISSION-ID']
+        transmission_time = headers['PAYPAL-TRANSMISSION-TIME']
+        signature = headers['PAYPAL-TRANSMISSION-SIG']
+        cert_url = headers['PAYPAL-CERT-URL']
+    except KeyError:
+        raise WebhookError('Faltan las cabeceras de firma')
+    parsed = urlparse(cert_url)
+    if parsed.scheme != 'https' or not (parsed.hostname or '').endswith('.paypal.com'):
+        raise WebhookError('URL de certificado no válida')
+
+    if x509 is not None:
+        # Verificación local: PayPal firma "id|fecha|webhook_id|crc32(cuerpo)"
+        # con RSA-SHA256; el certificado se cachea y no hay ida y vuelta por evento
+        message = f'{transmission_id}|{transmission_time}|{webhook_id}|{zlib.crc32(body)}'
+        try:
+            _certificate(cert_url).public_key().verify(
+                base64.b64decode(signature),
+                message.encode(),
+                padding.PKCS1v15(),
+                hashes.SHA256()
+            )
+        except (InvalidSignature, ValueError):
+            raise WebhookError('Firma no válida')
+        return
+
+    # Sin cryptography instalado se delega la verificación en la API de PayPal
+    import requests
+
+    response = requests.post(
+        f'{api_url()}/v1/notifications/verify-webhook-signature',
+        headers={'Authorization': f'Bearer {paypal_access_token()}'},
+        json={
+            'auth_algo': headers.get('PAYPAL-AUTH-ALGO', 'SHA256withRSA'),
+            'cert_url': cert_url,
+            'transmission_id': transmission_id,
+            'transmission_sig': signature,
+            'transmission_time': transmission_time,
+            'webhook_id': webhook_id,
+            'webhook_event': json.loads(body),
+        },
+        timeout=10
+    )
+    if response.status_code != 200 or response.json().get('verification_status') != 'SUCCESS':
+        raise WebhookError('Firma no válida')
+
+
+def event_payment_id(payload):
+    # Los eventos de captura apuntan a la orden de PayPal en related_ids
+    resource = payload.get('resource') or {}
+    if payload.get('event_type', '').startswith('PAYMENT.CAPTURE.'):
+        related = (resource.get('supplementary_data') or {}).get('related_ids') or {}
+        return related.get('order_id', '')
+    return resource.get('id', '')
+
+
+def schedule_processing(run_at=None):
+    # Basta con un trabajo en cola: cada ejecución procesa todo lo pendiente
+    run_at = run_at or timezone.now()
+    if not Job.objects.filter(name=PROCESS_TASK, status='queued', run_at__lte=run_at).exists():
+        enqueue(PROCESS_TASK, run_at=run_at)
+
+
+def ingest_event(payload):
+    # Devuelve (evento, creado). Una entrega repetida del mismo evento
+    # devuelve el evento ya guardado sin volver a encolarlo
+    event_id = payload.get('id')
+    if not event_id or not payload.get('event_type'):
+        raise WebhookError('Evento sin id o sin tipo')
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                event = PaymentEvent.objects.create(
+                    event_id=event_id,
+                    event_type=payload['event_type'],
+                    payment_id=event_payment_id(payload),
+                    payload=payload
+                )
+        except IntegrityError:
+            return PaymentEvent.objects.get(event_id=event_id), False
+        schedule_processing()
+    return event, True
+
+
+def max_attempts():
+    return getattr(settings, 'PAYPAL_WEBHOOK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def claim_events(worker_id, limit, now=None):
+    now = now or timezone.now()
+    token = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    stale = now - timedelta(seconds=getattr(settings, 'JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT))
+    # Un evento abandonado a mitad de proceso ya gastó su intento al
+    # reclamarse: si era el último no vuelve a reclamarse, queda fallido
+    PaymentEvent.objects.filter(
+        status='processing', locked_at__lt=stale, attempts__gte=max_attempts()
+    ).update(
+        status='failed',
+        locked_by='',
+        locked_at=None,
+        last_error='El procesamiento no terminó antes del tiempo límite',
+        processed_at=now
+    )
+    claimable = Q(status='received', run_at__lte=now) | Q(status='processing', locked_at__lt=stale)
+    with transaction.atomic():
+        pending = PaymentEvent.objects.filter(claimable).order_by('received_at')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        ids = list(pending.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        PaymentEvent.objects.filter(claimable, pk__in=ids).update(
+            status='processing',
+            locked_by=token,
+            locked_at=now,
+            attempts=F('attempts') + 1
+        )
+    return list(PaymentEvent.objects.filter(pk__in=ids, locked_by=token).order_by('received_at'))
+
+
+def event_amount(event):
+    # Importe cobrado según el evento: la captura lo lleva en resource.amount y
+    # la orden completada en sus purchase_units
+    resource = event.payload.get('resource') or {}
+    if event.event_type.startswith('PAYMENT.CAPTURE.'):
+        return paypal_amount([resource])
+    return paypal_amount(resource.get('purchase_units'))
+
+
+def complete_payment(event, checkouts, orders):
+    if event.payment_id in orders:
+        # Orden ya registrada por otro evento o por PaymentVerificationView
+        return 'processed'
+    checkout = checkouts.get(event.payment_id)
+    if checkout is None:
+        raise PaymentNotReady('No hay un checkout registrado para este pago')
+
+    try:
+        paid_amount, currency = event_amount(event)
+        order, _ = place_order(
+            event.payment_id,
+            checkout.cart_items,
+            user=checkout.user,
+            coupon_code=checkout.coupon_code or None,
+            paid_amount=paid_amount,
+            currency=currency
+        )
+    except InsufficientStock:
+        raise OrderError('Stock insuficiente')
+    except PricingError as e:
+        raise OrderError(str(e))
+
+    orders[event.payment_id] = order.pk
+    checkout.status = 'completed'
+    checkout.order = order
+    checkout.error = ''
+    checkout.save(update_fields=['status', 'order', 'error', 'updated'])
+    return 'processed'
+
+
+def reject_checkout(event, checkouts, message):
+    # El cobro ya está hecho: queda marcado para revisión manual
+    checkout = checkouts.get(event.payment_id)
+    if checkout is not None and checkout.status == 'pending':
+        checkout.status = 'failed'
+        checkout.error = message
+        checkout.save(update_fields=['status', 'error', 'updated'])
+    logger.error('No se pudo completar el pago %s: %s', event.payment_id, message)
+
+
+def fail_payment(event, checkouts):
+    checkout = checkouts.get(event.payment_id)
+    if checkout is not None and checkout.status == 'pending':
+        checkout.status = 'failed'
+        checkout.error = event.event_type
+        checkout.save(update_fields=['status', 'error', 'updated'])
+    return 'processed'
+
+
+def retry_or_fail(event, error):
+    # El intento ya se contó al reclamar el evento
+    event.last_error = error
+    if event.attempts < max_attempts():
+        event.status = 'received'
+        event.run_at = timezone.now() + retry_delay(event.attempts)
+    else:
+        event.status = 'failed'
+        event.processed_at = timezone.now()
+
+
+def process_batch(events):
+    # Los checkouts y las órdenes ya registradas de todo el lote se cargan
+    # con dos consultas; cada evento se procesa en su propio savepoint para
+    # que un evento defectuoso no arrastre al resto del lote
+    payment_ids = {event.payment_id for event in events if event.payment_id}
+    checkouts = {
+        checkout.payment_id: checkout
+        for checkout in PendingPayment.objects.filter(payment_id__in=payment_ids).select_related('user')
+    }
+    orders = dict(Order.objects.filter(payment_id__in=payment_ids).values_list('payment_id', 'pk'))
+
+    for event in events:
+        event.locked_by = ''
+        event.locked_at = None
+        try:
+            with transaction.atomic():
+                if event.event_type in COMPLETED_EVENTS:
+                    event.status = complete_payment(event, checkouts, orders)
+                elif event.event_type in FAILED_EVENTS:
+                    event.status = fail_payment(event, checkouts)
+                else:
+                    event.status = 'ignored'
+            event.last_error = ''
+            event.processed_at = timezone.now()
+        except PaymentNotReady as e:
+            # El webhook puede llegar antes que el registro del checkout
+            retry_or_fail(event, str(e))
+        except OrderError as e:
+            event.status = 'failed'
+            event.last_error = str(e)
+            event.processed_at = timezone.now()
+            reject_checkout(event, checkouts, str(e))
+        except Exception:
+            # Payload inesperado o error de base de datos: se reintenta con
+            # backoff hasta agotar los intentos
+            logger.exception('Error procesando el evento %s', event.event_id)
+            retry_or_fail(event, traceback.format_exc())
+        event.save(update_fields=[
+            'status', 'run_at', 'locked_by', 'locked_at', 'last_error', 'processed_at'
+        ])
+
+
+def process_payment_events(batch_size=None, worker_id='payments'):
+    batch_size = batch_size or getattr(settings, 'PAYPAL_WEBHOOK_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    processed = 0
+    while True:
+        events = claim_events(worker_id, batch_size)
+        if not events:
+            break
+        process_batch(events)
+        processed += len(events)
+
+    # Los eventos aplazados necesitan otra ejecución cuando venza su reintento
+    next_run = PaymentEvent.objects.filter(status='received').order_by('run_at').values_list('run_at', flat=True).first()
+    if next_run is not None:
+        schedule_processing(run_at=next_run)
+    return processed
+
+
+def register_checkout(payment_id, cart_item_ids, user=None, coupon_code=''):
+    # Un checkout solo se crea: repetir la misma petición es idempotente, pero
+    # nadie puede reescribir el carrito, el usuario o el cupón de uno existente
+    cart_item_ids = list(cart_item_ids)
+    coupon_code = coupon_code or ''
+    with transaction.atomic():
+        if Order.objects.filter(payment_id=payment_id).exists():
+            raise CheckoutConflict('El pago ya fue procesado')
+        checkout, created = PendingPayment.objects.get_or_create(
+            payment_id=payment_id,
+            defaults={
+                'user': user,
+                'cart_items': cart_item_ids,
+                'coupon_code': coupon_code,
+            }
+        )
+        if not created:
+            if checkout.status != 'pending':
+                raise CheckoutConflict('El pago ya fue procesado')
+            if checkout.user_id != (user.pk if user is not None else None):
+                raise CheckoutConflict('El checkout pertenece a otro usuario')
+            if checkout.cart_items != cart_item_ids or checkout.coupon_code != coupon_code:
+                raise CheckoutConflict('El checkout ya está registrado con otros datos')
+
+        # Si el webhook llegó antes que el checkout, se procesa ya sin esperar al reintento
+        if PaymentEvent.objects.filter(payment_id=payment_id, status='received').update(run_at=timezone.now()):
+            schedule_processing()
+    return checkout
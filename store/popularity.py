@@ -0,0 +1,172 @@
+import atexit
+import logging
+import math
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PopularProduct, ProductActivity
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_FLUSH_SIZE = 500
+DEFAULT_HALF_LIFE_HOURS = 72
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_TOP = 500
+DEFAULT_CART_WEIGHT = 5.0
+RECENTLY_VIEWED_SIZE = 20
+DEFAULT_RECENTLY_VIEWED_TTL = 30 * 86400
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# Los eventos se acumulan en memoria y un hilo en segundo plano los escribe
+# cada POPULARITY_FLUSH_INTERVAL segundos (o al llegar a POPULARITY_FLUSH_SIZE
+# eventos) con un UPDATE ... F() por producto. Las peticiones nunca escriben,
+# salvo con POPULARITY_FLUSH_THREAD = False (tests y scripts): sin hilo, la
+# petición que llega a POPULARITY_FLUSH_SIZE escribe el búfer.
+class CounterBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        self._views = Counter()
+        self._cart_adds = Counter()
+        self._pending = 0
+
+    def add(self, product_id, views=0, cart_adds=0):
+        threaded = _setting('POPULARITY_FLUSH_THREAD', True)
+        with self._lock:
+            if views:
+                self._views[product_id] += views
+            if cart_adds:
+                self._cart_adds[product_id] += cart_adds
+            self._pending += 1
+            # Tras un fork el hilo no existe en el proceso hijo y se vuelve a crear
+            if threaded and (self._flusher is None or not self._flusher.is_alive()):
+                self._flusher = threading.Thread(target=self._run, name='popularity-flush', daemon=True)
+                self._flusher.start()
+            full = self._pending >= _setting('POPULARITY_FLUSH_SIZE', DEFAULT_FLUSH_SIZE)
+            if full and threaded:
+                self._wake.set()
+        if full and not threaded:
+            self.flush()
+
+    def _run(self):
+        while True:
+            self._wake.wait(_setting('POPULARITY_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+            self._wake.clear()
+            self.flush()
+
+    def drain(self):
+        with self._lock:
+            views, cart_adds, pending = self._views, self._cart_adds, self._pending
+            self._views, self._cart_adds = Counter(), Counter()
+            self._pending = 0
+        return views, cart_adds, pending
+
+    def restore(self, views, cart_adds, pending):
+        with self._lock:
+            self._views.update(views)
+            self._cart_adds.update(cart_adds)
+            self._pending += pending
+
+    def flush(self):
+        views, cart_adds, pending = self.drain()
+        if not views and not cart_adds:
+            return
+        try:
+            write_counts(views, cart_adds)
+        except Exception:
+            # write_counts quita de los contadores lo ya escrito; el resto se
+            # devuelve al búfer para el siguiente intento (y sigue contando
+            # para POPULARITY_FLUSH_SIZE)
+            logger.exception('No se pudieron escribir los contadores de popularidad')
+            self.restore(views, cart_adds, pending)
+
+
+def write_counts(views, cart_adds, day=None):
+    day = day or timezone.now().date()
+    for product_id in sorted(set(views) | set(cart_adds)):
+        increments = {
+            'views': F('views') + views.get(product_id, 0),
+            'cart_adds': F('cart_adds') + cart_adds.get(product_id, 0),
+        }
+        with transaction.atomic():
+            updated = ProductActivity.objects.filter(product_id=product_id, day=day).update(**increments)
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        ProductActivity.objects.create(
+                            product_id=product_id,
+                            day=day,
+                            views=views.get(product_id, 0),
+                            cart_adds=cart_adds.get(product_id, 0)
+                        )
+                except IntegrityError:
+                    # Otro proceso creó la fila del día entre el UPDATE y el INSERT
+                    ProductActivity.objects.filter(product_id=product_id, day=day).update(**increments)
+        views.pop(product_id, None)
+        cart_adds.pop(product_id, None)
+
+
+counters = CounterBuffer()
+atexit.register(counters.flush)
+
+
+def record_view(product_id, user=None):
+    counters.add(product_id, views=1)
+    if user is not None and user.is_authenticated:
+        key = f'recently-viewed:{user.pk}'
+        recent = [pk for pk in cache.get(key, []) if pk != product_id]
+        cache.set(
+            key,
+            [product_id] + recent[:RECENTLY_VIEWED_SIZE - 1],
+            _setting('POPULARITY_RECENTLY_VIEWED_TTL', DEFAULT_RECENTLY_VIEWED_TTL)
+        )
+
+
+def record_cart_add(product_id, quantity=1):
+    counters.add(product_id, cart_adds=quantity)
+
+
+def recently_viewed(user):
+    if user is None or not user.is_authenticated:
+        return []
+    return cache.get(f'recently-viewed:{user.pk}', [])
+
+
+def refresh_popularity(now=None):
+    # score = sum((vistas + peso * añadidos) * 2^(-edad / vida_media)) sobre la ventana
+    now = now or timezone.now()
+    today = now.date()
+    half_life = _setting('POPULARITY_HALF_LIFE_HOURS', DEFAULT_HALF_LIFE_HOURS)
+    cart_weight = _setting('POPULARITY_CART_WEIGHT', DEFAULT_CART_WEIGHT)
+    since = today - timedelta(days=_setting('POPULARITY_WINDOW_DAYS', DEFAULT_WINDOW_DAYS))
+
+    scores = Counter()
+    rows = ProductActivity.objects.filter(day__gte=since).values_list(
+        'product_id', 'day', 'views', 'cart_adds'
+    )
+    for product_id, day, views, cart_adds in rows.iterator(chunk_size=2000):
+        age_hours = (today - day).days * 24
+        scores[product_id] += (views + cart_weight * cart_adds) * math.pow(2, -age_hours / half_life)
+
+    top = scores.most_common(_setting('POPULARITY_TOP', DEFAULT_TOP))
+    with transaction.atomic():
+        PopularProduct.objects.all().delete()
+        PopularProduct.objects.bulk_create([
+            PopularProduct(product_id=product_id, score=score, rank=rank, computed_at=now)
+            for rank, (product_id, score) in enumerate(top, start=1)
+        ], batch_size=1000)
+    return len(top)
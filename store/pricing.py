@@ -0,0 +1,110 @@
+from decimal import Decimal
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Product, Discount, Coupon, CouponUsage
+
+
+ZERO = Decimal('0.00')
+
+
+class PricingError(Exception):
+    pass
+
+
+def live_discounts_prefetch(now):
+    # Solo los descuentos vigentes en `now`; se resuelve en una única consulta
+    return Prefetch(
+        'discounts',
+        queryset=Discount.objects.filter(active=True, start_date__lte=now, end_date__gte=now),
+        to_attr='live_discounts'
+    )
+
+
+def best_discount(product, now):
+    best_amount = ZERO
+    best = None
+    for discount in product.live_discounts:
+        amount = discount.calculate_discount(product.price, now=now)
+        if amount > best_amount:
+            best_amount = amount
+            best = discount
+    return best_amount, best
+
+
+def coupon_error(coupon, cart_total, now, user=None):
+    if not coupon.active:
+        return 'El cupón no está activo'
+    if now < coupon.valid_from:
+        return 'El cupón aún no es válido'
+    if now > coupon.valid_to:
+        return 'El cupón ha expirado'
+    if coupon.max_uses and coupon.current_uses >= coupon.max_uses:
+        return 'El cupón ha alcanzado el límite de usos'
+    if cart_total < coupon.minimum_purchase:
+        return f'El monto mínimo de compra es ${coupon.minimum_purchase}'
+    if user is not None and CouponUsage.objects.filter(coupon=coupon, user=user).exists():
+        return 'El cupón ya fue utilizado'
+    return None
+
+
+# `items` es una lista de pares (product_id, quantity). Todas las reglas se
+# evalúan con el mismo instante `now` y productos y descuentos se cargan en
+# dos consultas, sin importar el número de líneas.
+def price_cart(items, coupon_code=None, user=None, now=None):
+    now = now or timezone.now()
+    product_ids = {product_id for product_id, _ in items}
+    products = Product.objects.filter(pk__in=product_ids, available=True).prefetch_related(
+        live_discounts_prefetch(now)
+    ).in_bulk()
+
+    lines = []
+    subtotal = ZERO
+    discount_total = ZERO
+    for product_id, quantity in items:
+        product = products.get(product_id)
+        if product is None:
+            raise PricingError(f'Producto {product_id} no disponible')
+        if quantity < 1:
+            raise PricingError(f'Cantidad inválida para el producto {product_id}')
+
+        discount_amount, discount = best_discount(product, now)
+        final_price = product.price - discount_amount
+        lines.append({
+            'product': product,
+            'quantity': quantity,
+            'unit_price': product.price,
+            'discount': discount,
+            'discount_amount': discount_amount,
+            'final_price': final_price,
+            'line_total': final_price * quantity,
+        })
+        subtotal += product.price * quantity
+        discount_total += discount_amount * quantity
+
+    discounted_total = subtotal - discount_total
+    coupon = None
+    coupon_discount = ZERO
+    error = None
+    if coupon_code:
+        coupon = Coupon.objects.filter(code=coupon_code.strip().upper()).first()
+        if coupon is None:
+            error = 'Cupón no encontrado'
+        else:
+            error = coupon_error(coupon, discounted_total, now, user=user)
+            if error is None:
+                coupon_discount = coupon.calculate_discount(discounted_total, now=now)
+            else:
+                coupon = None
+
+    return {
+        'lines': lines,
+        'subtotal': subtotal,
+        'discount_total': discount_total,
+        'coupon': coupon,
+        'coupon_discount': coupon_discount,
+        'coupon_error': error,
+        'total': discounted_total - coupon_discount,
+        'priced_at': now,
+    }
@@ -0,0 +1,200 @@
+import cProfile
+import io
+import marshal
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache import is_shared_cache
+
+
+DEFAULT_BUFFER_SIZE = 50
+DEFAULT_SAMPLE_INTERVAL = 0.005
+CONFIG_KEY = 'profiling:config'
+COUNTER_KEY = 'profiling:counter'
+CONFIG_REFRESH = 5
+LOCAL_CACHE_WARNING = (
+    'La caché no es compartida entre procesos (LocMemCache): la configuración y '
+    'las muestras solo existen en el worker que atendió la petición. Configure REDIS_URL.'
+)
+
+
+class ProfilingError(Exception):
+    pass
+
+
+def default_config():
+    return {
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'routes': list(getattr(settings, 'PROFILING_ROUTES', [])),
+        'sample_rate': getattr(settings, 'PROFILING_SAMPLE_RATE', 0.01),
+        'mode': getattr(settings, 'PROFILING_MODE', 'cprofile'),
+    }
+
+
+def buffer_size():
+    return getattr(settings, 'PROFILING_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)
+
+
+# La configuración vive en la caché compartida para poder activarla en
+# caliente en todos los workers; cada proceso la relee cada CONFIG_REFRESH s.
+# Con una caché local de proceso no se permite activarla desde la API.
+_local = {'config': None, 'loaded_at': 0.0}
+_cprofile_lock = threading.Lock()
+
+
+def get_config():
+    if _local['config'] is None or time.monotonic() - _local['loaded_at'] > CONFIG_REFRESH:
+        _local['config'] = cache.get(CONFIG_KEY) or default_config()
+        _local['loaded_at'] = time.monotonic()
+    return _local['config']
+
+
+def shared_storage():
+    return is_shared_cache('default')
+
+
+def set_config(**changes):
+    if changes.get('enabled') and not shared_storage():
+        raise ProfilingError(LOCAL_CACHE_WARNING)
+    config = dict(get_config())
+    config.update(changes)
+    cache.set(CONFIG_KEY, config, None)
+    _local['config'] = config
+    _local['loaded_at'] = time.monotonic()
+    return config
+
+
+def should_profile(request):
+    # Un usuario staff puede forzar el perfilado de una petición con la
+    # cabecera X-Profile: 1, esté o no activado por ruta
+    if request.META.get('HTTP_X_PROFILE') == '1':
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+
+    config = get_config()
+    if not config['enabled']:
+        return False
+    if config['routes'] and not any(request.path.startswith(route) for route in config['routes']):
+        return False
+    return random.random() < config['sample_rate']
+
+
+class StackSampler:
+    # Muestrea la pila del hilo de la petición cada `interval` segundos y
+    # acumula pilas colapsadas ("a;b;c N"), el formato de flamegraph.pl
+    def __init__(self, thread_id, interval=None):
+        self.thread_id = thread_id
+        self.interval = interval or getattr(settings, 'PROFILING_SAMPLE_INTERVAL', DEFAULT_SAMPLE_INTERVAL)
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def profile_call(func, mode):
+    if mode == 'sample':
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            result = func()
+        finally:
+            sampler.stop()
+        return result, {'collapsed': dict(sampler.stacks)}
+
+    # Solo puede haber un cProfile activo por proceso (en Python 3.12+ un
+    # segundo enable() lanza ValueError): si está ocupado no se perfila
+    if not _cprofile_lock.acquire(blocking=False):
+        return func(), None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Otra herramienta (depurador, coverage) ya está perfilando
+        _cprofile_lock.release()
+        return func(), None
+    try:
+        result = func()
+    finally:
+        profiler.disable()
+        _cprofile_lock.release()
+    profiler.create_stats()
+    # El formato de marshal es el que pstats.Stats lee desde un fichero
+    return result, {'pstats': marshal.dumps(profiler.stats)}
+
+
+def store_sample(request, response, duration_ms, mode, data):
+    # Búfer circular en la caché compartida: la muestra N ocupa la ranura N % tamaño
+    cache.add(COUNTER_KEY, 0, None)
+    sample_id = cache.incr(COUNTER_KEY)
+    sample = {
+        'id': sample_id,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': duration_ms,
+        'mode': mode,
+        'captured_at': timezone.now(),
+        **data,
+    }
+    cache.set(f'profiling:sample:{sample_id % buffer_size()}', sample, None)
+    return sample_id
+
+
+def list_samples():
+    keys = [f'profiling:sample:{slot}' for slot in range(buffer_size())]
+    samples = [sample for sample in cache.get_many(keys).values() if sample]
+    return sorted(samples, key=lambda sample: sample['id'], reverse=True)
+
+
+def get_sample(sample_id):
+    sample = cache.get(f'profiling:sample:{sample_id % buffer_size()}')
+    if sample is None or sample['id'] != sample_id:
+        return None
+    return sample
+
+
+def render_pstats_text(sample, limit=40):
+    import pstats
+
+    stream = io.StringIO()
+    stats = pstats.Stats(_StatsSource(sample['pstats']), stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def render_collapsed(sample):
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(sample['collapsed'].items()))
+
+
+class _StatsSource:
+    # pstats.Stats acepta cualquier objeto con create_stats() y stats
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
@@ -0,0 +1,113 @@
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import OrderLine, Product, RelatedProduct
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+
+DEFAULT_TOP_K = 10
+DEFAULT_MIN_SUPPORT = 2
+
+
+def order_baskets():
+    # Productos distintos de cada orden, leídos en bloque y en orden de orden
+    baskets = defaultdict(set)
+    lines = OrderLine.objects.filter(product__isnull=False).values_list('order_id', 'product_id')
+    for order_id, product_id in lines.iterator(chunk_size=5000):
+        baskets[order_id].add(product_id)
+    return [basket for basket in baskets.values() if len(basket) > 1]
+
+
+def cooccurrence_top_k(baskets, top_k, min_support):
+    if np is None:
+        return _cooccurrence_top_k_python(baskets, top_k, min_support)
+
+    product_ids = np.array(sorted({pid for basket in baskets for pid in basket}))
+    if not len(product_ids):
+        return {}
+    index = {pid: i for i, pid in enumerate(product_ids.tolist())}
+    rows = np.repeat(np.arange(len(baskets)), [len(basket) for basket in baskets])
+    cols = np.fromiter((index[pid] for basket in baskets for pid in basket), dtype=np.int64, count=len(rows))
+
+    # Matriz cesta x producto binaria; X^T X da las co-ocurrencias por pares
+    baskets_matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(baskets), len(product_ids))
+    )
+    counts = (baskets_matrix.T @ baskets_matrix).tocsr()
+    counts.setdiag(0)
+    counts.data[counts.data < min_support] = 0
+    counts.eliminate_zeros()
+
+    neighbours = {}
+    for i in range(counts.shape[0]):
+        start, end = counts.indptr[i], counts.indptr[i + 1]
+        if start == end:
+            continue
+        data = counts.data[start:end]
+        columns = counts.indices[start:end]
+        # Mayor conteo primero; a igualdad, id de producto ascendente
+        order = np.lexsort((product_ids[columns], -data))[:top_k]
+        neighbours[int(product_ids[i])] = [
+            (int(product_ids[columns[j]]), float(data[j])) for j in order
+        ]
+    return neighbours
+
+
+def _cooccurrence_top_k_python(baskets, top_k, min_support):
+    pairs = Counter()
+    for basket in baskets:
+        for a, b in combinations(sorted(basket), 2):
+            pairs[(a, b)] += 1
+
+    candidates = defaultdict(list)
+    for (a, b), count in pairs.items():
+        if count >= min_support:
+            candidates[a].append((b, float(count)))
+            candidates[b].append((a, float(count)))
+    return {
+        pid: sorted(related, key=lambda item: (-item[1], item[0]))[:top_k]
+        for pid, related in candidates.items()
+    }
+
+
+def build_recommendations(top_k=None, min_support=None):
+    top_k = top_k or getattr(settings, 'RECOMMENDATIONS_TOP_K', DEFAULT_TOP_K)
+    if min_support is None:
+        min_support = getattr(settings, 'RECOMMENDATIONS_MIN_SUPPORT', DEFAULT_MIN_SUPPORT)
+
+    neighbours = cooccurrence_top_k(order_baskets(), top_k, min_support)
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create([
+            RelatedProduct(product_id=product_id, related_id=related_id, score=score, rank=rank)
+            for product_id, related in neighbours.items()
+            for rank, (related_id, score) in enumerate(related, start=1)
+        ], batch_size=2000)
+    return len(neighbours)
+
+
+def related_products(product_id, category_id, limit=None):
+    # Una consulta indexada sobre (product, rank); si hay pocos datos se
+    # completa con productos de la misma categoría
+    limit = limit or getattr(settings, 'RECOMMENDATIONS_TOP_K', DEFAULT_TOP_K)
+    ids = list(
+        RelatedProduct.objects.filter(product_id=product_id, related__available=True)
+        .order_by('rank').values_list('related_id', flat=True)[:limit]
+    )
+    if len(ids) < limit:
+        ids += list(
+            Product.objects.filter(category_id=category_id, available=True)
+            .exclude(pk__in=ids + [product_id])
+            .order_by('-created').values_list('pk', flat=True)[:limit - len(ids)]
+        )
+    return ids
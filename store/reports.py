@@ -0,0 +1,165 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import CouponRollup, CouponUsage, Order, RollupCheckpoint, SalesRollup
+
+
+ROLLUP_LOOKBACK = timedelta(hours=2)
+CHECKPOINT_NAME = 'sales'
+
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value):
+    value = timezone.localtime(value)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rebuild_hours(start, end):
+    # Recalcula por completo las horas [start, end) desde las filas crudas;
+    # es idempotente y puede repetirse sin duplicar importes
+    start, end = floor_hour(start), floor_hour(end) + timedelta(hours=1)
+    sales = Order.objects.filter(
+        status='paid', created__gte=start, created__lt=end
+    ).annotate(bucket=TruncHour('created')).values('bucket').annotate(
+        orders=Count('pk'),
+        order_total=Sum('total'),
+        discount_total=Sum('discount_total'),
+        coupon_discount=Sum('coupon_discount'),
+    ).order_by()
+    coupons = CouponUsage.objects.filter(
+        used_at__gte=start, used_at__lt=end
+    ).annotate(bucket=TruncHour('used_at')).values('coupon_id', 'bucket').annotate(
+        uses=Count('pk'),
+        order_total=Sum('order_total'),
+        discount_amount=Sum('discount_amount'),
+    ).order_by()
+
+    with transaction.atomic():
+        SalesRollup.objects.filter(period='hour', bucket__gte=start, bucket__lt=end).delete()
+        SalesRollup.objects.bulk_create([SalesRollup(period='hour', **row) for row in sales])
+        CouponRollup.objects.filter(period='hour', bucket__gte=start, bucket__lt=end).delete()
+        CouponRollup.objects.bulk_create([CouponRollup(period='hour', **row) for row in coupons])
+
+
+def rebuild_days(start, end):
+    # Los días se suman a partir de las horas ya agregadas, sin volver a
+    # leer órdenes ni usos de cupones
+    start, end = floor_day(start), floor_day(end) + timedelta(days=1)
+    sales = SalesRollup.objects.filter(
+        period='hour', bucket__gte=start, bucket__lt=end
+    ).annotate(day=TruncDay('bucket')).values('day').annotate(
+        total_orders=Sum('orders'),
+        total_amount=Sum('order_total'),
+        total_discount=Sum('discount_total'),
+        total_coupon=Sum('coupon_discount'),
+    ).order_by()
+    coupons = CouponRollup.objects.filter(
+        period='hour', bucket__gte=start, bucket__lt=end
+    ).annotate(day=TruncDay('bucket')).values('coupon_id', 'day').annotate(
+        total_uses=Sum('uses'),
+        total_amount=Sum('order_total'),
+        total_discount=Sum('discount_amount'),
+    ).order_by()
+
+    with transaction.atomic():
+        SalesRollup.objects.filter(period='day', bucket__gte=start, bucket__lt=end).delete()
+        SalesRollup.objects.bulk_create([
+            SalesRollup(
+                period='day',
+                bucket=row['day'],
+                orders=row['total_orders'],
+                order_total=row['total_amount'],
+                discount_total=row['total_discount'],
+                coupon_discount=row['total_coupon'],
+            )
+            for row in sales
+        ])
+        CouponRollup.objects.filter(period='day', bucket__gte=start, bucket__lt=end).delete()
+        CouponRollup.objects.bulk_create([
+            CouponRollup(
+                coupon_id=row['coupon_id'],
+                period='day',
+                bucket=row['day'],
+                uses=row['total_uses'],
+                order_total=row['total_amount'],
+                discount_amount=row['total_discount'],
+            )
+            for row in coupons
+        ])
+
+
+def update_rollups(now=None):
+    # Trabajo programado: reconstruye desde la última ejecución registrada
+    # (como mínimo las últimas ROLLUP_LOOKBACK) para que una ejecución
+    # perdida no deje horas sin agregar
+    now = now or timezone.now()
+    start = now - ROLLUP_LOOKBACK
+    last = RollupCheckpoint.objects.filter(name=CHECKPOINT_NAME).values_list('rolled_up_to', flat=True).first()
+    if last is not None and last < start:
+        start = last
+
+    if now - start > timedelta(days=1):
+        backfill_rollups(start, now)
+    else:
+        rebuild_hours(start, now)
+        rebuild_days(start, now)
+    RollupCheckpoint.objects.update_or_create(name=CHECKPOINT_NAME, defaults={'rolled_up_to': now})
+    return start
+
+
+def backfill_rollups(start=None, end=None, chunk=timedelta(days=7)):
+    end = end or timezone.now()
+    if start is None:
+        first_order = Order.objects.order_by('created').values_list('created', flat=True).first()
+        first_usage = CouponUsage.objects.order_by('used_at').values_list('used_at', flat=True).first()
+        candidates = [value for value in (first_order, first_usage) if value is not None]
+        if not candidates:
+            return 0
+        start = min(candidates)
+
+    chunks = 0
+    cursor = floor_day(start)
+    while cursor <= end:
+        # Cada tramo termina justo antes de medianoche para no solapar días
+        chunk_end = min(cursor + chunk - timedelta(microseconds=1), end)
+        rebuild_hours(cursor, chunk_end)
+        rebuild_days(cursor, chunk_end)
+        cursor += chunk
+        chunks += 1
+    return chunks
+
+
+def _totals(rows, fields):
+    return {field: sum((row[field] for row in rows), 0) for field in fields}
+
+
+def sales_report(start, end, period='day', coupon=None):
+    sales = list(
+        SalesRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end)
+        .order_by('bucket').values('bucket', 'orders', 'order_total', 'discount_total', 'coupon_discount')
+    )
+    report = {
+        'start': start,
+        'end': end,
+        'period': period,
+        'totals': _totals(sales, ['orders', 'order_total', 'discount_total', 'coupon_discount']),
+        'series': sales,
+    }
+    if coupon is not None:
+        usage = list(
+            CouponRollup.objects.filter(coupon=coupon, period=period, bucket__gte=start, bucket__lt=end)
+            .order_by('bucket').values('bucket', 'uses', 'order_total', 'discount_amount')
+        )
+        report['coupon'] = {
+            'code': coupon.code,
+            'totals': _totals(usage, ['uses', 'order_total', 'discount_amount']),
+            'series': usage,
+        }
+    return report
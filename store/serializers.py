@@ -1,7 +1,37 @@
 from rest_framework import serializers
-from .models import Category, Product, CartItem, Customer, Coupon, Discount
+from .models import Category, Product, CartItem, Customer, Coupon, Discount, CouponCampaign
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from django.utils import timezone
+from decimal import Decimal
+from .catalogue import (
+    CATEGORY_VALUES, PRODUCT_VALUES, category_row, category_rows, product_discount_rows
+)
+from .loaders import current_identity_map
+from .orders import cart_items_for
+
+
+class PrimingListSerializer(serializers.ListSerializer):
+    # Antes de serializar la lista, el hijo carga en bloque todo lo que sus
+    # campos anidados van a necesitar
+    def to_representation(self, data):
+        iterable = list(data.all() if hasattr(data, 'all') else data)
+        self.child.prime(iterable)
+        return super().to_representation(iterable)
+
+
+class PrimedSerializerMixin:
+    @property
+    def identity_map(self):
+        return self.context.setdefault('identity_map', current_identity_map())
+
+    def prime(self, instances):
+        pass
+
+    def to_representation(self, instance):
+        # En listas ya está precargado y esto no consulta la base de datos
+        self.prime([instance])
+        return super().to_representation(instance)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -9,27 +39,6 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'slug', 'description', 'image']
 
-class ProductSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
-    category_id = serializers.IntegerField(write_only=True)
-    
-    class Meta:
-        model = Product
-        fields = [
-            'id', 'category', 'category_id', 'name', 'slug',
-            'description', 'price', 'stock', 'available',
-            'image', 'created', 'updated'
-        ]
-
-class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
-    product_id = serializers.IntegerField(write_only=True)
-    
-    class Meta:
-        model = CartItem
-        fields = ['id', 'product', 'product_id', 'quantity', 'created']
-
-        
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -85,9 +94,35 @@ class CouponSerializer(serializers.ModelSerializer):
             'current_uses'
         ]
 
-# Actualizar el ProductSerializer para incluir descuentos
-class ProductSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+class CachedCategoryField(serializers.Field):
+    # Igual que CategorySerializer anidado, pero leyendo la categoría de la
+    # caché del catálogo en lugar de cargarla por cada producto
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs.setdefault('source', 'category_id')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return _category_data(category_row(value), self.context.get('request'))
+
+class CouponCampaignSerializer(serializers.ModelSerializer):
+    coupons_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CouponCampaign
+        fields = [
+            'id', 'name', 'description', 'code_prefix', 'code_length',
+            'discount_value', 'is_percentage', 'minimum_purchase',
+            'valid_from', 'valid_to', 'coupons_count', 'created'
+        ]
+
+    def get_coupons_count(self, obj):
+        # En los listados viene anotado desde CouponCampaignViewSet.get_queryset
+        count = getattr(obj, 'coupons_count', None)
+        return obj.coupons.count() if count is None else count
+
+class ProductSerializer(PrimedSerializerMixin, serializers.ModelSerializer):
+    category = CachedCategoryField()
     category_id = serializers.IntegerField(write_only=True)
     current_price = serializers.SerializerMethodField()
     active_discounts = serializers.SerializerMethodField()
@@ -99,12 +134,16 @@ class ProductSerializer(serializers.ModelSerializer):
             'description', 'price', 'current_price', 'active_discounts',
             'stock', 'available', 'image', 'created', 'updated'
         ]
+        list_serializer_class = PrimingListSerializer
+
+    def prime(self, instances):
+        self.identity_map.load_active_discounts(instances)
 
     def get_current_price(self, obj):
         best_discount = 0
         original_price = float(obj.price)
         
-        for discount in obj.discounts.filter(active=True):
+        for discount in self.identity_map.active_discounts(obj):
             if discount.is_valid():
                 discount_amount = float(discount.calculate_discount(original_price))
                 best_discount = max(best_discount, discount_amount)
@@ -113,6 +152,198 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_active_discounts(self, obj):
         return DiscountSerializer(
-            [d for d in obj.discounts.filter(active=True) if d.is_valid()],
+            [d for d in self.identity_map.active_discounts(obj) if d.is_valid()],
             many=True
-        ).data
\ No newline at end of file
+        ).data
+
+class CartItemSerializer(PrimedSerializerMixin, serializers.ModelSerializer):
+    product = ProductSerializer(read_only=True)
+    product_id = serializers.IntegerField(write_only=True)
+    
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'product_id', 'quantity', 'created']
+        list_serializer_class = PrimingListSerializer
+
+    def prime(self, instances):
+        products = self.identity_map.load_related(instances, 'product')
+        self.fields['product'].prime(products)
+
+class QuoteItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class CartQuoteSerializer(serializers.Serializer):
+    items = QuoteItemSerializer(many=True, allow_empty=False)
+    coupon_code = serializers.CharField(required=False, allow_blank=True)
+
+
+# Ruta rápida de solo lectura para el catálogo: produce exactamente la misma
+# salida que CategorySerializer/ProductSerializer pero a partir de filas
+# .values(), sin instanciar modelos ni recorrer los campos de DRF por objeto.
+_datetime_field = serializers.DateTimeField()
+_price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+_discount_value_field = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
+def _file_url(model, name, request):
+    if not name:
+        return None
+    url = model._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _category_data(row, request):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'slug': row['slug'],
+        'description': row['description'],
+        'image': _file_url(Category, row['image'], request),
+    }
+
+
+def _discount_amount(discount, original_price):
+    original_price = Decimal(str(original_price))
+    if discount['discount_type'] == 'percentage':
+        return (original_price * discount['value'] / Decimal('100')).quantize(Decimal('0.01'))
+    return min(discount['value'], original_price)
+
+
+def _product_data(row, category, discounts, request, now):
+    live = [d for d in discounts if d['start_date'] <= now <= d['end_date']]
+    original_price = float(row['price'])
+    best_discount = 0
+    for discount in live:
+        best_discount = max(best_discount, float(_discount_amount(discount, original_price)))
+
+    return {
+        'id': row['id'],
+        'category': _category_data(category, request),
+        'name': row['name'],
+        'slug': row['slug'],
+        'description': row['description'],
+        'price': _price_field.to_representation(row['price']),
+        'current_price': original_price - best_discount,
+        'active_discounts': [
+            {
+                'id': discount['id'],
+                'name': discount['name'],
+                'description': discount['description'],
+                'discount_type': discount['discount_type'],
+                'value': _discount_value_field.to_representation(discount['value']),
+                'active': discount['active'],
+                'start_date': _datetime_field.to_representation(discount['start_date']),
+                'end_date': _datetime_field.to_representation(discount['end_date']),
+            }
+            for discount in live
+        ],
+        'stock': row['stock'],
+        'available': row['available'],
+        'image': _file_url(Product, row['image'], request),
+        'created': _datetime_field.to_representation(row['created']),
+        'updated': _datetime_field.to_representation(row['updated']),
+    }
+
+
+def fast_category_data(queryset, request=None):
+    return [_category_data(row, request) for row in queryset.values(*CATEGORY_VALUES)]
+
+
+def cached_category_data(request=None):
+    return [_category_data(row, request) for row in category_rows().values()]
+
+
+def fast_product_data(queryset, request=None, now=None):
+    now = now or timezone.now()
+    rows = list(queryset.values(*PRODUCT_VALUES))
+    if not rows:
+        return []
+
+    discounts = product_discount_rows([row['id'] for row in rows])
+    return [
+        _product_data(row, category_row(row['category_id']), discounts.get(row['id'], []), request, now)
+        for row in rows
+    ]
+
+
+def product_detail_data(entry, request=None, now=None):
+    now = now or timezone.now()
+    row = entry['row']
+    return _product_data(row, category_row(row['category_id']), entry['discounts'], request, now)
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False, input_formats=['iso-8601', '%Y-%m-%d'])
+    end = serializers.DateTimeField(required=False, input_formats=['iso-8601', '%Y-%m-%d'])
+    period = serializers.ChoiceField(choices=['hour', 'day'], default='day')
+    coupon = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        # Sin `end` el informe llega hasta ahora
+        end = attrs.get('end') or timezone.now()
+        if attrs.get('start') and attrs['start'] > end:
+            raise serializers.ValidationError({'start': 'La fecha de inicio es posterior a la de fin'})
+        return attrs
+
+class SalesTotalsSerializer(serializers.Serializer):
+    orders = serializers.IntegerField()
+    order_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    discount_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    coupon_discount = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class SalesRollupSerializer(SalesTotalsSerializer):
+    bucket = serializers.DateTimeField()
+
+class CouponTotalsSerializer(serializers.Serializer):
+    uses = serializers.IntegerField()
+    order_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class CouponRollupSerializer(CouponTotalsSerializer):
+    bucket = serializers.DateTimeField()
+
+class ProfilingConfigSerializer(serializers.Serializer):
+    enabled = serializers.BooleanField(required=False)
+    routes = serializers.ListField(child=serializers.CharField(), required=False)
+    sample_rate = serializers.FloatField(required=False, min_value=0, max_value=1)
+    mode = serializers.ChoiceField(choices=['cprofile', 'sample'], required=False)
+
+class ProfileSampleSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    method = serializers.CharField()
+    path = serializers.CharField()
+    status = serializers.IntegerField()
+    duration_ms = serializers.FloatField()
+    mode = serializers.CharField()
+    captured_at = serializers.DateTimeField()
+
+class BulkProductUpdateSerializer(serializers.Serializer):
+    category = serializers.ListField(child=serializers.SlugField(), required=False)
+    discount = serializers.IntegerField(required=False)
+    slugs = serializers.ListField(child=serializers.SlugField(), required=False)
+    field = serializers.ChoiceField(choices=['price', 'stock'])
+    operation = serializers.ChoiceField(choices=['set', 'add', 'percent', 'round99'])
+    value = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    round_99 = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        # El stock son unidades: int() truncaría 1.5 a 1 sin avisar
+        value = attrs.get('value')
+        if attrs['field'] == 'stock' and attrs['operation'] in ('set', 'add') and value is not None and value != int(value):
+            raise serializers.ValidationError({'value': 'El stock debe ser un número entero'})
+        return attrs
+
+class PaymentCheckoutSerializer(serializers.Serializer):
+    orderID = serializers.CharField(max_length=64)
+    cart_items = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    coupon_code = serializers.CharField(required=False, allow_blank=True, max_length=50, default='')
+
+    def validate_cart_items(self, value):
+        # Solo artículos del carrito de quien registra el pago
+        owned = cart_items_for(self.context.get('user')).filter(pk__in=value).count()
+        if owned != len(set(value)):
+            raise serializers.ValidationError('Hay artículos que no están en su carrito')
+        return value
@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import catalogue_cache
+from .models import Category, Discount, Product
+
+
+# La versión se incrementa al confirmar la transacción; si se hiciera antes,
+# otro proceso podría volver a cachear los datos viejos bajo la versión nueva
+def bump_on_commit(namespace):
+    transaction.on_commit(lambda: catalogue_cache.bump(namespace))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, **kwargs):
+    bump_on_commit('category')
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Discount)
+def invalidate_products(sender, **kwargs):
+    bump_on_commit('product')
+
+
+@receiver(m2m_changed, sender=Discount.products.through)
+def invalidate_product_discounts(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_on_commit('product')
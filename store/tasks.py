@@ -0,0 +1,39 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .models import Order
+
+
+logger = logging.getLogger(__name__)
+
+
+def send_order_confirmation(order_id):
+    order = Order.objects.select_related('user').get(pk=order_id)
+    if order.user is None or not order.user.email:
+        return
+    send_mail(
+        f'Confirmación de tu orden #{order.pk}',
+        f'Gracias por tu compra. Total pagado: ${order.total}',
+        getattr(settings, 'DEFAULT_FROM_EMAIL', None),
+        [order.user.email],
+    )
+
+
+def notify_order_webhooks(order_id):
+    urls = getattr(settings, 'ORDER_WEBHOOK_URLS', [])
+    if not urls:
+        return
+    import requests
+
+    order = Order.objects.get(pk=order_id)
+    payload = {
+        'id': order.pk,
+        'payment_id': order.payment_id,
+        'status': order.status,
+        'total': str(order.total),
+    }
+    for url in urls:
+        response = requests.post(url, json=payload, timeout=10)
+        response.raise_for_status()
@@ -1,3 +1,946 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, OperationalError, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import recommendations
+from .admin import EstimatedCountPaginator
+from .bulk import bulk_update_products, select_products
+from .cache import TwoTierCache, catalogue_cache
+from .coupons import generate_campaign_codes
+from .inventory import (
+    InsufficientStock, commit_reservations, release_expired_reservations, reserve_stock
+)
+from .jobs import claim_jobs, enqueue, requeue_stale_jobs, retry_delay, run_job
+from .middleware import CompressionMiddleware
+from .models import (
+    CartItem, Category, Coupon, CouponCampaign, CouponUsage, Discount, Job, Order, OrderLine, PaymentEvent,
+    PendingPayment, Product, ProductActivity, RelatedProduct, RollupCheckpoint, SalesRollup, StockReservation
+)
+from .orders import OrderError, paypal_amount, place_order
+from .payments import PROCESS_TASK, ingest_event, process_payment_events, register_checkout
+from .popularity import CounterBuffer
+from .profiling import _cprofile_lock, get_config, profile_call, set_config
+from .reports import update_rollups
+from .serializers import CategorySerializer, ProductSerializer, fast_category_data, fast_product_data
+from .warmup import warm_serializers, warmup_on_boot
+
+
+def create_product(slug='producto', price='10.00', stock=5, category=None):
+    if category is None:
+        category = Category.objects.create(name=f'Categoría {slug}', slug=f'categoria-{slug}')
+    return Product.objects.create(
+        category=category,
+        name=slug,
+        slug=slug,
+        price=price,
+        stock=stock
+    )
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secreto')
+        self.client.force_login(self.admin)
+
+    def test_apply_discount_reports_new_links(self):
+        products = [create_product(slug=f'producto-{i}') for i in range(3)]
+        now = timezone.now()
+        discount = Discount.objects.create(
+            name='Rebajas',
+            discount_type='percentage',
+            value=Decimal('10.00'),
+            start_date=now,
+            end_date=now + timedelta(days=1)
+        )
+        discount.products.add(products[0])
+
+        response = self.client.post('/admin/store/product/', {
+            'action': 'apply_discount',
+            'discount': discount.pk,
+            '_selected_action': [product.pk for product in products],
+        }, follow=True)
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages, ['Descuento "Rebajas" aplicado a 2 productos nuevos'])
+        self.assertEqual(discount.products.count(), 3)
+
+    def test_paginator_counts_outside_postgresql(self):
+        create_product()
+        model_admin = site._registry[Product]
+        # En SQLite, y con filtros en cualquier motor, se usa el COUNT(*) exacto
+        with self.assertNumQueries(1):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.all(), 10).count, 1)
+        self.assertIs(model_admin.paginator, EstimatedCountPaginator)
+
+    def test_paginator_counts_filtered_querysets(self):
+        create_product()
+        # Con filtros la estimación de pg_class no sirve ni siquiera en PostgreSQL
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            paginator = EstimatedCountPaginator(Product.objects.filter(stock=0), 10)
+            self.assertEqual(paginator.count, 0)
+
+
+class CatalogueCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TwoTierCache(alias='default')
+        self.fills = []
+
+    def fill(self):
+        self.fills.append(True)
+        return len(self.fills)
+
+    def test_bump_invalidates_namespace(self):
+        self.assertEqual(self.cache.get_or_set('product', 'lista', self.fill), 1)
+        self.assertEqual(self.cache.get_or_set('product', 'lista', self.fill), 1)
+        self.cache.bump('category')
+        self.assertEqual(self.cache.get_or_set('product', 'lista', self.fill), 1)
+
+        self.cache.bump('product')
+        self.assertEqual(self.cache.get_or_set('product', 'lista', self.fill), 2)
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['local_hits'], stats['invalidations']), (2, 2, 2))
+
+    def test_waiter_does_not_release_foreign_fill_lock(self):
+        lock_key = f"{self.cache.make_key('product', 'lista')}:fill"
+        cache.add(lock_key, 'otro-proceso', 10)
+        with mock.patch('store.cache.FILL_WAIT', 0.1):
+            self.assertEqual(self.cache.get_or_set('product', 'lista', self.fill), 1)
+        self.assertEqual(cache.get(lock_key), 'otro-proceso')
+
+        # El dueño del candado sí lo libera al terminar
+        self.assertEqual(self.cache.get_or_set('product', 'otra', self.fill), 2)
+        self.assertIsNone(cache.get(f"{self.cache.make_key('product', 'otra')}:fill"))
+
+    def test_stock_writes_invalidate_products(self):
+        product = create_product()
+        version = catalogue_cache.version('product')
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = reserve_stock(product.pk, 1)
+        self.assertNotEqual(catalogue_cache.version('product'), version)
+
+        version = catalogue_cache.version('product')
+        with self.captureOnCommitCallbacks(execute=True):
+            commit_reservations([reservation])
+        self.assertNotEqual(catalogue_cache.version('product'), version)
+
+    def test_stats_endpoint_is_admin_only(self):
+        response = self.client.get('/api/cache/stats/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secreto'))
+        data = self.client.get('/api/cache/stats/', HTTP_ACCEPT='application/json').json()
+        self.assertIn('hit_ratio', data)
+        self.assertFalse(data['shared_backend'])
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.product = create_product(stock=5)
+
+    def test_reserve_more_than_available_raises(self):
+        reserve_stock(self.product.pk, 3)
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(self.product.pk, 3)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 3)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_commit_released_reservation_decrements_stock(self):
+        reservation = reserve_stock(self.product.pk, 2)
+        StockReservation.objects.filter(pk=reservation.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertEqual(release_expired_reservations(), 1)
+
+        commit_reservations([reservation])
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(self.product.reserved, 0)
+
+    def test_commit_released_reservation_without_stock_raises(self):
+        reservation = reserve_stock(self.product.pk, 2)
+        StockReservation.objects.filter(pk=reservation.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        release_expired_reservations()
+        reserve_stock(self.product.pk, 4)
+
+        with self.assertRaises(InsufficientStock):
+            commit_reservations([reservation])
+
+    def test_sweep_restores_reserved_once(self):
+        reserve_stock(self.product.pk, 2)
+        reserve_stock(self.product.pk, 1)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_reservations(), 2)
+        self.assertEqual(release_expired_reservations(), 0)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertEqual(self.product.stock, 5)
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.product = create_product(price='20.00', stock=5)
+        self.item = CartItem.objects.create(product=self.product, quantity=2)
+
+    def test_paid_amount_mismatch_raises(self):
+        with self.assertRaises(OrderError):
+            place_order('PAY-1', [self.item.pk], paid_amount=Decimal('1.00'), currency='USD')
+        self.assertFalse(Order.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_paid_currency_mismatch_raises(self):
+        with self.assertRaises(OrderError):
+            place_order('PAY-1', [self.item.pk], paid_amount=Decimal('40.00'), currency='EUR')
+        self.assertFalse(Order.objects.exists())
+
+    def test_matching_amount_places_order(self):
+        order, created = place_order('PAY-1', [self.item.pk], paid_amount=Decimal('40.00'), currency='USD')
+        self.assertTrue(created)
+        self.assertEqual(order.total, Decimal('40.00'))
+
+    def test_concurrent_coupon_reuse_raises_order_error(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='UNAVEZ',
+            discount_value=Decimal('10.00'),
+            valid_from=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1)
+        )
+        user = User.objects.create_user('cliente', password='secreto')
+        CartItem.objects.filter(pk=self.item.pk).update(user=user)
+        CouponUsage.objects.create(
+            coupon=coupon, user=user, order_total=Decimal('36.00'), discount_amount=Decimal('4.00')
+        )
+        # Simula que la otra petición registró su uso después de la validación
+        with mock.patch('store.pricing.coupon_error', return_value=None):
+            with self.assertRaisesMessage(OrderError, 'El cupón ya fue utilizado'):
+                place_order('PAY-1', [self.item.pk], user=user, coupon_code='unavez')
+
+        self.assertFalse(Order.objects.exists())
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.current_uses, 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_paypal_amount_sums_purchase_units(self):
+        units = [
+            {'amount': {'currency_code': 'USD', 'value': '10.50'}},
+            {'amount': {'currency_code': 'USD', 'value': '4.50'}},
+        ]
+        self.assertEqual(paypal_amount(units), (Decimal('15.00'), 'USD'))
+        with self.assertRaises(OrderError):
+            paypal_amount([])
+
+
+class CompressionTests(TestCase):
+    body = json.dumps([{'id': i, 'name': f'Producto {i}'} for i in range(200)]).encode()
+
+    def process(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/api/products/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        # Fuerza gzip aunque brotli esté instalado
+        with mock.patch('store.middleware.brotli', None):
+            return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=None):
+        return HttpResponse(body or self.body, content_type='application/json')
+
+    def test_large_json_is_gzipped(self):
+        response = self.process(self.json_response())
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_response_is_not_compressed(self):
+        response = self.process(self.json_response(b'{"ok": true}'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{"ok": true}')
+
+    def test_client_without_gzip_gets_identity_with_vary(self):
+        for accept_encoding in ['', 'identity', 'gzip;q=0']:
+            response = self.process(self.json_response(), accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(response.content, self.body)
+
+    def test_encoded_and_excluded_responses_are_untouched(self):
+        response = self.json_response()
+        response['Content-Encoding'] = 'br'
+        self.assertEqual(self.process(response).content, self.body)
+
+        # text/html no está en COMPRESSION_CONTENT_TYPES (BREACH)
+        response = self.process(HttpResponse(self.body, content_type='text/html'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response_is_compressed_per_chunk(self):
+        lines = [json.dumps({'id': i}).encode() + b'\n' for i in range(3)]
+        response = self.process(StreamingHttpResponse(iter(lines), content_type='application/x-ndjson'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(lines))
+
+
+class QueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Libros', slug='libros')
+        now = timezone.now()
+        self.discount = Discount.objects.create(
+            name='Rebajas',
+            discount_type='percentage',
+            value=Decimal('10.00'),
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=1)
+        )
+        self.add_products(2)
+
+    def add_products(self, count):
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            product = create_product(slug=f'libro-{i}', category=self.category)
+            self.discount.products.add(product)
+            CartItem.objects.create(product=product, quantity=1)
+
+    def assertConstantQueries(self, url, queries):
+        # Se calienta la caché de categorías; después el número de consultas
+        # no depende del número de filas
+        self.client.get(url, HTTP_ACCEPT='application/json')
+        for _ in range(2):
+            with self.assertNumQueries(queries):
+                data = self.client.get(url, HTTP_ACCEPT='application/json').json()
+            self.add_products(5)
+        return data
+
+    def test_product_list(self):
+        data = self.assertConstantQueries('/api/products/', 2)
+        self.assertEqual(len(data), 7)
+
+    def test_category_products(self):
+        data = self.assertConstantQueries('/api/categories/libros/products/', 2)
+        self.assertEqual(data[0]['category']['slug'], 'libros')
+
+    def test_cart_list_nests_full_product(self):
+        data = self.assertConstantQueries('/api/cart/', 3)
+        self.assertEqual(len(data), 7)
+        self.assertEqual(data[0]['product']['current_price'], 9.0)
+        self.assertEqual(data[0]['product']['active_discounts'][0]['name'], 'Rebajas')
+
+
+class WarmupTests(TestCase):
+    def test_warm_serializers_does_not_query(self):
+        with self.assertNumQueries(0):
+            warm_serializers()
+
+    def test_boot_warmup_survives_unavailable_database(self):
+        with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError):
+            with self.assertLogs('store.warmup', 'WARNING'):
+                warmup_on_boot()
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/api/products/')
+        self.category = Category.objects.create(name='Libros', slug='libros', image='categories/libros.png')
+        self.plain = create_product(slug='sin-descuento', price='19.99', category=self.category)
+        self.discounted = create_product(slug='con-descuento', price='80.00', category=self.category)
+        Product.objects.filter(pk=self.discounted.pk).update(image='products/portada.jpg')
+        now = timezone.now()
+        for value, discount_type in [('15.00', 'percentage'), ('5.00', 'fixed')]:
+            discount = Discount.objects.create(
+                name=f'Descuento {value}',
+                discount_type=discount_type,
+                value=Decimal(value),
+                start_date=now - timedelta(days=1),
+                end_date=now + timedelta(days=1)
+            )
+            discount.products.add(self.discounted)
+
+    def serialize(self, data):
+        return json.loads(json.dumps(data))
+
+    def test_products_match_drf_serializer(self):
+        products = Product.objects.filter(pk__in=[self.plain.pk, self.discounted.pk]).order_by('pk')
+        expected = ProductSerializer(products, many=True, context={'request': self.request}).data
+        self.assertEqual(self.serialize(fast_product_data(products, self.request)), self.serialize(expected))
+        self.assertEqual(expected[1]['current_price'], 68.0)
+        self.assertTrue(expected[1]['image'].endswith('/media/products/portada.jpg'))
+
+    def test_categories_match_drf_serializer(self):
+        categories = Category.objects.order_by('pk')
+        expected = CategorySerializer(categories, many=True, context={'request': self.request}).data
+        self.assertEqual(self.serialize(fast_category_data(categories, self.request)), self.serialize(expected))
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        self.books = Category.objects.create(name='Libros', slug='libros')
+        self.games = Category.objects.create(name='Juegos', slug='juegos')
+        cheap = create_product(slug='libro', price='10.00', category=self.books)
+        create_product(slug='libro-caro', price='120.00', category=self.books)
+        create_product(slug='juego', price='30.00', category=self.games)
+        now = timezone.now()
+        discount = Discount.objects.create(
+            name='Rebajas',
+            discount_type='percentage',
+            value=Decimal('10.00'),
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=1)
+        )
+        discount.products.add(cheap)
+
+    def facets(self, **params):
+        return self.client.get('/api/products/facets/', params).json()
+
+    def test_category_facet_ignores_category_filter(self):
+        data = self.facets(category='libros')
+        self.assertEqual(
+            [(category['slug'], category['count']) for category in data['categories']],
+            [('juegos', 1), ('libros', 2)]
+        )
+        # Las demás facetas sí respetan la categoría elegida
+        self.assertEqual(data['discount'], {'on_sale': 1, 'regular': 1})
+        self.assertEqual(sum(bucket['count'] for bucket in data['price']), 2)
+
+    def test_price_facet_ignores_price_filter(self):
+        data = self.facets(max_price='50')
+        counts = {bucket['range']: bucket['count'] for bucket in data['price']}
+        self.assertEqual(counts['0-25'], 1)
+        self.assertEqual(counts['25-50'], 1)
+        self.assertEqual(counts['100-250'], 1)
+        self.assertEqual(sum(category['count'] for category in data['categories']), 2)
+
+    def test_discount_facet_ignores_on_sale_filter(self):
+        data = self.facets(on_sale='1')
+        self.assertEqual(data['discount'], {'on_sale': 1, 'regular': 2})
+        self.assertEqual([category['slug'] for category in data['categories']], ['libros'])
+
+
+class QuoteTests(TestCase):
+    def setUp(self):
+        self.product = create_product(price='20.00', stock=5)
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            code='DIEZ',
+            discount_value=Decimal('10.00'),
+            minimum_purchase=Decimal('30.00'),
+            valid_from=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1)
+        )
+
+    def quote(self, quantity=2, coupon_code='diez', product_id=None):
+        data = {'items': [{'product_id': product_id or self.product.pk, 'quantity': quantity}]}
+        if coupon_code:
+            data['coupon_code'] = coupon_code
+        return self.client.post('/api/cart/quote/', data, content_type='application/json')
+
+    def test_coupon_is_applied(self):
+        data = self.quote().json()
+        self.assertEqual(data['subtotal'], '40.00')
+        self.assertTrue(data['coupon']['valid'])
+        self.assertEqual(data['coupon']['discount_amount'], '4.00')
+        self.assertEqual(data['total'], '36.00')
+
+    def test_expired_coupon_is_not_applied(self):
+        Coupon.objects.filter(pk=self.coupon.pk).update(valid_to=timezone.now() - timedelta(hours=1))
+        data = self.quote().json()
+        self.assertFalse(data['coupon']['valid'])
+        self.assertEqual(data['coupon']['message'], 'El cupón ha expirado')
+        self.assertEqual(data['total'], '40.00')
+
+    def test_minimum_purchase_is_enforced(self):
+        data = self.quote(quantity=1).json()
+        self.assertFalse(data['coupon']['valid'])
+        self.assertIn('30.00', data['coupon']['message'])
+        self.assertEqual(data['total'], '20.00')
+
+    def test_unknown_item_is_rejected(self):
+        response = self.quote(product_id=999, coupon_code=None)
+        self.assertEqual(response.status_code, 400)
+
+    def test_apply_coupon_uses_pricing_rules(self):
+        response = self.client.post('/api/cart/apply_coupon/', {'code': 'diez', 'cart_total': '20.00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('30.00', response.json()['message'])
+
+        response = self.client.post('/api/cart/apply_coupon/', {'code': 'diez', 'cart_total': '40.00'})
+        self.assertEqual(response.json()['final_total'], '36.00')
+        self.assertEqual(response['Deprecation'], 'true')
+
+
+def failing_task(**kwargs):
+    raise RuntimeError('fallo')
+
+
+def noop_task(**kwargs):
+    pass
+
+
+class JobTests(TestCase):
+    def test_claim_counts_attempt_and_locks_job(self):
+        job = enqueue('store.tests.noop_task', value=1)
+        claimed = claim_jobs('worker-1')
+        self.assertEqual([claimed_job.pk for claimed_job in claimed], [job.pk])
+        self.assertEqual(claimed[0].status, 'running')
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertTrue(claimed[0].locked_by.startswith('worker-1:'))
+        # Un segundo worker no vuelve a tomarlo
+        self.assertEqual(claim_jobs('worker-2'), [])
+
+        self.assertTrue(run_job(claimed[0]))
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'done')
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = enqueue('store.tests.failing_task', max_attempts=2)
+        with self.assertLogs('store.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim_jobs('worker')[0]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('RuntimeError', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + retry_delay(1) - timedelta(seconds=5))
+        self.assertEqual(retry_delay(2), 2 * retry_delay(1))
+
+        # Aún no toca: el reintento respeta el backoff
+        self.assertEqual(claim_jobs('worker'), [])
+        with self.assertLogs('store.jobs', 'ERROR'):
+            run_job(claim_jobs('worker', now=job.run_at)[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_jobs_are_requeued_or_failed(self):
+        retry = enqueue('store.tests.noop_task', max_attempts=2)
+        last = enqueue('store.tests.noop_task', max_attempts=1)
+        claim_jobs('muerto')
+
+        later = timezone.now() + timedelta(hours=1)
+        self.assertEqual(requeue_stale_jobs(), 0)
+        self.assertEqual(requeue_stale_jobs(later), 2)
+
+        retry.refresh_from_db()
+        self.assertEqual(retry.status, 'queued')
+        self.assertEqual(retry.locked_by, '')
+        # El intento contado al reclamarlo era el último
+        last.refresh_from_db()
+        self.assertEqual(last.status, 'failed')
+        self.assertIsNotNone(last.finished_at)
+
+
+# Sin hilo de escritura: los tests deciden cuándo se vacía el búfer
+@override_settings(POPULARITY_FLUSH_THREAD=False, POPULARITY_FLUSH_SIZE=3)
+class PopularityTests(TestCase):
+    def test_failed_flush_keeps_counts(self):
+        product = create_product()
+        buffer = CounterBuffer()
+        buffer.add(product.pk, views=3)
+        buffer.add(product.pk, views=1)
+        with mock.patch('store.popularity.ProductActivity.objects.create', side_effect=DatabaseError):
+            with self.assertLogs('store.popularity', 'ERROR'):
+                buffer.flush()
+        self.assertFalse(ProductActivity.objects.exists())
+        self.assertIsNone(buffer._flusher)
+
+        # Los eventos devueltos al búfer siguen contando para el tamaño máximo
+        buffer.add(product.pk, views=1)
+        self.assertEqual(ProductActivity.objects.get(product=product).views, 5)
+
+    def test_popular_limit_is_clamped(self):
+        create_product()
+        response = self.client.get('/api/products/popular/', {'limit': -1})
+        self.assertEqual(response.status_code, 200)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Libros', slug='libros')
+        products = [create_product(slug=f'libro-{i}', category=category) for i in range(6)]
+        baskets = [
+            [0, 1, 2], [0, 1, 2], [0, 1], [0, 2, 3], [0, 3],
+            [1, 2, 4], [1, 4], [3, 4, 5], [3, 5], [0, 5], [2],
+        ]
+        for number, basket in enumerate(baskets):
+            order = Order.objects.create(payment_id=f'PAY-{number}', subtotal=Decimal('10.00'), total=Decimal('10.00'))
+            OrderLine.objects.bulk_create([
+                OrderLine(
+                    order=order,
+                    product=products[index],
+                    product_name=products[index].name,
+                    quantity=1,
+                    unit_price=Decimal('10.00'),
+                    final_price=Decimal('10.00'),
+                    line_total=Decimal('10.00')
+                )
+                for index in basket
+            ])
+
+    def related_rows(self):
+        return list(RelatedProduct.objects.order_by('product_id', 'rank').values_list(
+            'product_id', 'related_id', 'rank', 'score'
+        ))
+
+    @skipIf(recommendations.np is None, 'numpy/scipy no están instalados')
+    def test_numpy_and_python_paths_agree(self):
+        for top_k, min_support in [(10, 1), (2, 2), (1, 1)]:
+            recommendations.build_recommendations(top_k=top_k, min_support=min_support)
+            vectorized = self.related_rows()
+            with mock.patch.object(recommendations, 'np', None):
+                recommendations.build_recommendations(top_k=top_k, min_support=min_support)
+            self.assertTrue(vectorized)
+            self.assertEqual(self.related_rows(), vectorized)
+
+
+class RollupTests(TestCase):
+    def create_order(self, payment_id, created):
+        order = Order.objects.create(payment_id=payment_id, subtotal=Decimal('10.00'), total=Decimal('10.00'))
+        Order.objects.filter(pk=order.pk).update(created=created)
+
+    def test_missed_runs_are_caught_up(self):
+        now = timezone.now().replace(minute=30)
+        self.create_order('PAY-1', now - timedelta(hours=1))
+        update_rollups(now)
+
+        # El cron no se ejecutó durante seis horas
+        self.create_order('PAY-2', now + timedelta(hours=1))
+        update_rollups(now + timedelta(hours=6))
+
+        hours = SalesRollup.objects.filter(period='hour')
+        self.assertEqual(sum(hours.values_list('orders', flat=True)), 2)
+        self.assertEqual(RollupCheckpoint.objects.get().rolled_up_to, now + timedelta(hours=6))
+
+
+    def test_report_rejects_reversed_range(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secreto'))
+        response = self.client.get('/api/reports/', {'start': '2024-02-01', 'end': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start', response.json())
+
+        response = self.client.get('/api/reports/', {'start': '2024-01-01', 'end': '2024-02-01'})
+        self.assertEqual(response.status_code, 200)
+
+
+class CouponCampaignTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.campaign = CouponCampaign.objects.create(
+            name='Campaña',
+            code_prefix='CMP',
+            code_length=8,
+            discount_value=Decimal('10.00'),
+            valid_from=now,
+            valid_to=now + timedelta(days=30)
+        )
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secreto')
+        self.client.force_login(self.admin)
+
+    def test_retried_generation_converges_on_target(self):
+        self.assertEqual(generate_campaign_codes(self.campaign.pk, 30, chunk_size=10), 30)
+        # Un reintento del mismo trabajo no añade cupones
+        self.assertEqual(generate_campaign_codes(self.campaign.pk, 30, chunk_size=10), 0)
+        self.assertEqual(self.campaign.coupons.count(), 30)
+
+    def test_collisions_are_retried_a_bounded_number_of_times(self):
+        generate_campaign_codes(self.campaign.pk, 1)
+        taken = Coupon.objects.get().code
+        with mock.patch('store.coupons.random_code', return_value=taken):
+            with self.assertRaises(IntegrityError):
+                generate_campaign_codes(self.campaign.pk, 2)
+        self.assertEqual(self.campaign.coupons.count(), 1)
+
+    def test_list_counts_coupons_in_one_query(self):
+        generate_campaign_codes(self.campaign.pk, 3)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/campaigns/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()[0]['coupons_count'], 3)
+
+    def test_campaign_with_coupons_cannot_be_deleted(self):
+        generate_campaign_codes(self.campaign.pk, 1)
+        response = self.client.delete(f'/api/campaigns/{self.campaign.pk}/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Coupon.objects.count(), 1)
+
+
+class ProfilingTests(TestCase):
+    def test_concurrent_cprofile_request_is_not_profiled(self):
+        # Simula otra petición perfilándose en el mismo proceso
+        with _cprofile_lock:
+            result, data = profile_call(lambda: 'respuesta', 'cprofile')
+        self.assertEqual(result, 'respuesta')
+        self.assertIsNone(data)
+
+        result, data = profile_call(lambda: 'respuesta', 'cprofile')
+        self.assertIn('pstats', data)
+
+    def test_profiling_cannot_be_enabled_on_local_cache(self):
+        self.addCleanup(set_config, enabled=False)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secreto'))
+        response = self.client.post('/api/profiling/config/', {'enabled': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(get_config()['enabled'])
+
+        data = self.client.get('/api/profiling/', HTTP_ACCEPT='application/json').json()
+        self.assertFalse(data['shared_cache'])
+        self.assertIn('REDIS_URL', data['warning'])
+
+        with mock.patch('store.profiling.is_shared_cache', return_value=True):
+            response = self.client.post('/api/profiling/config/', {'enabled': True}, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['shared_cache'])
+
+
+PAYPAL_FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'paypal')
+FIXTURE_ORDER_ID = '5O190127TN364715T'
+DENIED_ORDER_ID = '8RU61172JS455403V'
+
+
+def paypal_fixture(name):
+    with open(os.path.join(PAYPAL_FIXTURES, name)) as f:
+        return json.load(f)
+
+
+class PaymentWebhookTests(TestCase):
+    def setUp(self):
+        # Los eventos grabados cobran 45.00 USD: 2 x 22.50
+        self.product = create_product(price='22.50', stock=5)
+        self.item = CartItem.objects.create(product=self.product, quantity=2)
+
+    def test_duplicate_deliveries_are_ignored(self):
+        for name in sorted(os.listdir(PAYPAL_FIXTURES)):
+            event, created = ingest_event(paypal_fixture(name))
+            self.assertTrue(created)
+            event, created = ingest_event(paypal_fixture(name))
+            self.assertFalse(created)
+        self.assertEqual(PaymentEvent.objects.count(), 3)
+        self.assertEqual(Job.objects.filter(name=PROCESS_TASK, status='queued').count(), 1)
+
+    def test_event_before_checkout_is_retried(self):
+        ingest_event(paypal_fixture('checkout_order_completed.json'))
+        ingest_event(paypal_fixture('payment_capture_completed.json'))
+        process_payment_events()
+
+        event = PaymentEvent.objects.get(event_type='CHECKOUT.ORDER.COMPLETED')
+        self.assertEqual(event.status, 'received')
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.run_at, timezone.now())
+        self.assertFalse(Order.objects.exists())
+
+        # Registrar el checkout deja los eventos aplazados listos para procesarse
+        register_checkout(FIXTURE_ORDER_ID, [self.item.pk])
+        self.assertLessEqual(PaymentEvent.objects.get(pk=event.pk).run_at, timezone.now())
+        process_payment_events()
+
+        order = Order.objects.get()
+        self.assertEqual(order.payment_id, FIXTURE_ORDER_ID)
+        self.assertEqual(order.total, Decimal('45.00'))
+        self.assertEqual(set(PaymentEvent.objects.values_list('status', flat=True)), {'processed'})
+        self.assertEqual(PendingPayment.objects.get().status, 'completed')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_amount_mismatch_fails_checkout(self):
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('25.18'))
+        register_checkout(FIXTURE_ORDER_ID, [self.item.pk])
+        ingest_event(paypal_fixture('payment_capture_completed.json'))
+        with self.assertLogs('store.payments', 'ERROR'):
+            process_payment_events()
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(PaymentEvent.objects.get().status, 'failed')
+        checkout = PendingPayment.objects.get()
+        self.assertEqual(checkout.status, 'failed')
+        self.assertIn('45.00', checkout.error)
+
+    def test_denied_capture_fails_checkout(self):
+        register_checkout(DENIED_ORDER_ID, [self.item.pk])
+        ingest_event(paypal_fixture('payment_capture_denied.json'))
+        process_payment_events()
+
+        self.assertEqual(PendingPayment.objects.get().status, 'failed')
+        self.assertFalse(Order.objects.exists())
+
+    def post_checkout(self, data):
+        return self.client.post('/api/payments/checkout/', data, content_type='application/json')
+
+    def test_checkout_cannot_be_rewritten(self):
+        data = {'orderID': FIXTURE_ORDER_ID, 'cart_items': [self.item.pk]}
+        self.assertEqual(self.post_checkout(data).status_code, 202)
+        self.assertEqual(self.post_checkout(data).status_code, 202)
+
+        other_item = CartItem.objects.create(product=self.product, quantity=1)
+        self.assertEqual(self.post_checkout(dict(data, cart_items=[other_item.pk])).status_code, 409)
+
+        PendingPayment.objects.update(status='completed')
+        self.assertEqual(self.post_checkout(data).status_code, 409)
+        self.assertEqual(PendingPayment.objects.get().cart_items, [self.item.pk])
+
+    def test_checkout_rejects_invalid_input(self):
+        invalid = [
+            {'cart_items': [self.item.pk]},
+            {'orderID': FIXTURE_ORDER_ID},
+            {'orderID': FIXTURE_ORDER_ID, 'cart_items': []},
+            {'orderID': FIXTURE_ORDER_ID, 'cart_items': self.item.pk},
+            {'orderID': FIXTURE_ORDER_ID, 'cart_items': ['abc']},
+            {'orderID': FIXTURE_ORDER_ID, 'cart_items': [0]},
+            {'orderID': FIXTURE_ORDER_ID, 'cart_items': [-1]},
+            {'orderID': FIXTURE_ORDER_ID, 'cart_items': [999]},
+            {'orderID': 'X' * 65, 'cart_items': [self.item.pk]},
+        ]
+        for data in invalid:
+            with self.subTest(data=data):
+                self.assertEqual(self.post_checkout(data).status_code, 400)
+        self.assertFalse(PendingPayment.objects.exists())
+
+    def test_checkout_only_accepts_own_cart_items(self):
+        owner = User.objects.create_user('cliente', password='secreto')
+        owned = CartItem.objects.create(product=self.product, quantity=1, user=owner)
+        data = {'orderID': FIXTURE_ORDER_ID, 'cart_items': [owned.pk]}
+        # Ni un anónimo ni otro usuario pueden registrar el carrito ajeno
+        self.assertEqual(self.post_checkout(data).status_code, 400)
+        self.client.force_login(User.objects.create_user('otro', password='secreto'))
+        self.assertEqual(self.post_checkout(data).status_code, 400)
+        self.assertEqual(self.client.get('/api/cart/', HTTP_ACCEPT='application/json').json(), [])
+
+        self.client.force_login(owner)
+        self.assertEqual(self.post_checkout(data).status_code, 202)
+        self.assertEqual(PendingPayment.objects.get().user, owner)
+
+    def test_payment_status_hides_order_from_other_users(self):
+        owner = User.objects.create_user('cliente', password='secreto')
+        register_checkout(FIXTURE_ORDER_ID, [self.item.pk], user=owner)
+        url = f'/api/payments/{FIXTURE_ORDER_ID}/'
+
+        self.assertEqual(self.client.get(url).json(), {'status': 'pending'})
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get(url).json(), {'status': 'pending', 'order': None, 'message': ''})
+
+    def test_bad_event_does_not_abort_batch(self):
+        # Un checkout con datos corruptos hace fallar su evento, no el lote
+        PendingPayment.objects.create(payment_id=DENIED_ORDER_ID, cart_items=['abc'])
+        broken = paypal_fixture('checkout_order_completed.json')
+        broken.update(id='WH-ROTO', resource=dict(broken['resource'], id=DENIED_ORDER_ID))
+        ingest_event(broken)
+        register_checkout(FIXTURE_ORDER_ID, [self.item.pk])
+        ingest_event(paypal_fixture('payment_capture_completed.json'))
+
+        with self.assertLogs('store.payments', 'ERROR'):
+            process_payment_events()
+
+        self.assertEqual(Order.objects.get().payment_id, FIXTURE_ORDER_ID)
+        event = PaymentEvent.objects.get(event_id='WH-ROTO')
+        self.assertEqual((event.status, event.attempts), ('received', 1))
+        self.assertIn('ValueError', event.last_error)
+
+        # Agotados los intentos el evento queda fallido
+        PaymentEvent.objects.filter(pk=event.pk).update(run_at=timezone.now(), attempts=4)
+        with self.assertLogs('store.payments', 'ERROR'):
+            process_payment_events()
+        self.assertEqual(PaymentEvent.objects.get(pk=event.pk).status, 'failed')
+
+    def test_stale_event_fails_after_last_attempt(self):
+        event, _ = ingest_event(paypal_fixture('payment_capture_denied.json'))
+        PaymentEvent.objects.filter(pk=event.pk).update(
+            status='processing', attempts=5, locked_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(process_payment_events(), 0)
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'failed')
+        self.assertEqual(event.locked_by, '')
+
+
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Ofertas', slug='ofertas')
+        self.products = [
+            create_product(slug=f'producto-{i}', price='10.00', stock=10, category=self.category)
+            for i in range(5)
+        ]
+        self.queryset = select_products(categories=['ofertas'])
+
+    def values(self, field):
+        return sorted(set(Product.objects.values_list(field, flat=True)))
+
+    def test_price_operations(self):
+        cases = [
+            ('set', Decimal('12.50'), Decimal('12.50')),
+            ('add', Decimal('-2.25'), Decimal('7.75')),
+            ('percent', Decimal('15'), Decimal('11.50')),
+            ('round99', None, Decimal('9.99')),
+        ]
+        for operation, value, expected in cases:
+            with self.subTest(operation=operation):
+                Product.objects.update(price=Decimal('10.00'))
+                result = bulk_update_products(self.queryset, 'price', operation, value=value)
+                self.assertEqual(result['updated'], 5)
+                self.assertEqual(self.values('price'), [expected])
+
+    def test_round_99_after_percent(self):
+        bulk_update_products(self.queryset, 'price', 'percent', value=Decimal('23'), round_99=True)
+        self.assertEqual(self.values('price'), [Decimal('12.99')])
+
+    def test_price_never_goes_negative(self):
+        bulk_update_products(self.queryset, 'price', 'add', value=Decimal('-50'))
+        self.assertEqual(self.values('price'), [Decimal('0.00')])
+
+    def test_stock_operations(self):
+        cases = [('set', 3, 3), ('add', 4, 14), ('percent', Decimal('-50'), 5)]
+        for operation, value, expected in cases:
+            with self.subTest(operation=operation):
+                Product.objects.update(stock=10)
+                bulk_update_products(self.queryset, 'stock', operation, value=value)
+                self.assertEqual(self.values('stock'), [expected])
+
+    def test_stock_never_below_reserved(self):
+        reserve_stock(self.products[0].pk, 4)
+        bulk_update_products(self.queryset, 'stock', 'set', value=1)
+        stocks = dict(Product.objects.values_list('pk', 'stock'))
+        self.assertEqual(stocks[self.products[0].pk], 4)
+        self.assertEqual(stocks[self.products[1].pk], 1)
+
+    def test_chunks_bump_cache_once_each(self):
+        with mock.patch('store.signals.catalogue_cache.bump') as bump:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                result = bulk_update_products(self.queryset, 'stock', 'add', value=1, chunk_size=2)
+        self.assertEqual(result, {'updated': 5, 'chunks': 3})
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(bump.call_count, 3)
+        bump.assert_called_with('product')
+
+    def test_invalid_requests_are_rejected(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secreto'))
+        cases = [
+            {'category': ['ofertas'], 'field': 'stock', 'operation': 'set', 'value': '1.5'},
+            {'category': ['ofertas'], 'field': 'stock', 'operation': 'add', 'value': '-0.5'},
+            {'field': 'price', 'operation': 'set', 'value': '5'},
+            {'category': ['ofertas'], 'field': 'stock', 'operation': 'round99'},
+            {'category': ['ofertas'], 'field': 'price', 'operation': 'add'},
+        ]
+        for data in cases:
+            with self.subTest(data=data):
+                response = self.client.post('/api/products/bulk_update/', data, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.values('stock'), [10])
+        self.assertEqual(self.values('price'), [Decimal('10.00')])
+
+        response = self.client.post(
+            '/api/products/bulk_update/',
+            {'category': ['ofertas'], 'field': 'stock', 'operation': 'add', 'value': '2.00'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json(), {'updated': 5, 'chunks': 1})
+        self.assertEqual(self.values('stock'), [12])
@@ -8,9 +8,19 @@ router.register(r'products', views.ProductViewSet)
 router.register(r'cart', views.CartItemViewSet, basename='cart')
 router.register(r'discounts', views.DiscountViewSet)
 router.register(r'coupons', views.CouponViewSet)
+router.register(r'campaigns', views.CouponCampaignViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('register/', views.register_user, name='register'),
     path('login/', views.login_user, name='login'),
+    path('reports/', views.sales_report_view, name='reports'),
+    path('cache/stats/', views.cache_stats, name='cache-stats'),
+    path('profiling/', views.profiling_samples, name='profiling-samples'),
+    path('profiling/config/', views.profiling_config, name='profiling-config'),
+    path('profiling/<int:sample_id>/', views.profiling_sample, name='profiling-sample'),
+    path('payments/verify/', views.PaymentVerificationView.as_view(), name='payment-verify'),
+    path('payments/checkout/', views.PaymentCheckoutView.as_view(), name='payment-checkout'),
+    path('payments/webhook/', views.PayPalWebhookView.as_view(), name='payment-webhook'),
+    path('payments/<str:payment_id>/', views.payment_status, name='payment-status'),
 ]
\ No newline at end of file
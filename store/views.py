@@ -1,127 +1,147 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import action
-from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
-from .models import Category, Product, CartItem, Customer, Coupon, Discount
-from .serializers import CategorySerializer, ProductSerializer, CartItemSerializer,UserSerializer, CouponSerializer, RegisterSerializer, DiscountSerializer 
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, ProtectedError
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from decimal import Decimal
-import requests
-from django.conf import settings
+from rest_framework import viewsets, status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .bulk import BulkUpdateError, bulk_update_products, select_products
+from .cache import catalogue_cache
+from .catalogue import category_by_slug, product_entry
+from .coupons import MAX_CAMPAIGN_CODES, normalize_code
+from .filters import filter_products, product_facets
+from .inventory import InsufficientStock, reserve_stock, release_cart_item
+from .jobs import enqueue
+from .models import (
+    CartItem, Category, Coupon, CouponCampaign, Customer, Discount, Order, PendingPayment, Product
+)
+from .orders import OrderError, cart_items_for, paypal_amount, place_order
+from .payments import CheckoutConflict, WebhookError, ingest_event, register_checkout, verify_signature
+from .popularity import record_cart_add, record_view, recently_viewed
+from .pricing import PricingError, coupon_error, price_cart
+from .profiling import (
+    LOCAL_CACHE_WARNING, ProfilingError, get_config, get_sample, list_samples, render_collapsed,
+    render_pstats_text, set_config, shared_storage
+)
+from .recommendations import related_products
+from .renderers import FastJSONRenderer
+from .reports import sales_report
+from .serializers import (
+    BulkProductUpdateSerializer, CartItemSerializer, CartQuoteSerializer, CategorySerializer,
+    CouponCampaignSerializer, CouponRollupSerializer, CouponSerializer, CouponTotalsSerializer,
+    DiscountSerializer, PaymentCheckoutSerializer, ProductSerializer, ProfileSampleSerializer,
+    ProfilingConfigSerializer, RegisterSerializer, ReportQuerySerializer, SalesRollupSerializer,
+    SalesTotalsSerializer, UserSerializer, cached_category_data, fast_product_data, product_detail_data
+)
+
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        return Response(cached_category_data(request))
 
     @action(detail=True, methods=['get'])
     def products(self, request, slug=None):
-        category = self.get_object()
-        products = Product.objects.filter(category=category, available=True)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        category = category_by_slug(slug)
+        if category is None:
+            raise Http404
+        products = Product.objects.filter(category_id=category['id'], available=True)
+        return Response(fast_product_data(products))
 
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     lookup_field = 'slug'
-    
-    def get_queryset(self):
-        queryset = Product.objects.filter(available=True)
-        category_slug = self.request.query_params.get('category', None)
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
-        return queryset.prefetch_related('discounts')
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
-class CartItemViewSet(viewsets.ModelViewSet):
-    queryset = CartItem.objects.all()
-    serializer_class = CartItemSerializer
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(fast_product_data(queryset, request))
 
-    @action(detail=False, methods=['get'])
-    def get_cart_total(self, request):
-        cart_items = self.get_queryset()
-        total = sum(item.product.price * item.quantity for item in cart_items)
-        return Response({
-            'total': total,
-            'items_count': cart_items.count()
-        })
+    def retrieve(self, request, *args, **kwargs):
+        entry = product_entry(kwargs[self.lookup_field])
+        if entry is None:
+            raise Http404
+        record_view(entry['row']['id'], request.user)
+        return Response(product_detail_data(entry, request))
 
-    @action(detail=False, methods=['post'])
-    def apply_coupon(self, request):
-        code = request.data.get('code', '').strip().upper()  # Convertimos a mayúsculas
-        cart_total = float(request.data.get('cart_total', 0))
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'Debe ser un número'})
+        products = Product.objects.filter(
+            available=True,
+            popularity__isnull=False
+        ).order_by('popularity__rank')[:limit]
+        return Response(fast_product_data(products, request))
 
-        print(f"Intentando aplicar cupón: {code}")  # Debug
-        print(f"Total del carrito: {cart_total}")  # Debug
-        
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_update(self, request):
+        serializer = BulkProductUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
         try:
-            coupon = Coupon.objects.get(code__iexact=code)  # Búsqueda case-insensitive
-            print(f"Cupón encontrado: {coupon}")  # Debug
-            print(f"Cupón activo: {coupon.active}")
-            print(f"Validez: {coupon.valid_from} - {coupon.valid_to}")
-            
-            # Validación detallada
-            now = timezone.now()
-            if not coupon.active:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón no está activo'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if now < coupon.valid_from:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón aún no es válido'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if now > coupon.valid_to:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón ha expirado'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if coupon.max_uses and coupon.current_uses >= coupon.max_uses:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón ha alcanzado el límite de usos'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if cart_total < coupon.minimum_purchase:
-                return Response({
-                    'valid': False,
-                    'message': f'El monto mínimo de compra es ${coupon.minimum_purchase}'
-                }, status=status.HTTP_400_BAD_REQUEST)
+            queryset = select_products(
+                categories=params.get('category'),
+                discount=params.get('discount'),
+                slugs=params.get('slugs')
+            )
+            result = bulk_update_products(
+                queryset,
+                params['field'],
+                params['operation'],
+                value=params.get('value'),
+                round_99=params['round_99']
+            )
+        except BulkUpdateError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
 
-            # Calcular descuento
-            discount_amount = coupon.calculate_discount(cart_total)
-            
-            return Response({
-                'valid': True,
-                'discount_amount': float(discount_amount),
-                'final_total': cart_total - float(discount_amount),
-                'message': 'Cupón aplicado exitosamente'
-            })
-            
-        except Coupon.DoesNotExist:
-            return Response({
-                'valid': False,
-                'message': 'Cupón no encontrado'
-            }, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            print(f"Error al aplicar cupón: {str(e)}")  # Debug
-            return Response({
-                'valid': False,
-                'message': 'Error al procesar el cupón'
-            }, status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=True, methods=['get'])
+    def related(self, request, slug=None):
+        entry = product_entry(slug)
+        if entry is None:
+            raise Http404
+        row = entry['row']
+        ids = related_products(row['id'], row['category_id'])
+        data = {p['id']: p for p in fast_product_data(Product.objects.filter(pk__in=ids), request)}
+        return Response([data[pk] for pk in ids if pk in data])
+
+    @action(detail=False, methods=['get'])
+    def recent(self, request):
+        ids = recently_viewed(request.user)
+        data = {p['id']: p for p in fast_product_data(Product.objects.filter(pk__in=ids, available=True), request)}
+        return Response([data[pk] for pk in ids if pk in data])
     
+    def get_queryset(self):
+        queryset = Product.objects.filter(available=True)
+        return filter_products(queryset, self.request.query_params, timezone.now())
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        now = timezone.now()
+        return Response(product_facets(Product.objects.filter(available=True), request.query_params, now))
+
 @api_view(['POST'])
 def register_user(request):
     try:
@@ -192,7 +212,7 @@ class CouponViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def validate(self, request):
-        code = request.data.get('code')
+        code = normalize_code(request.data.get('code'))
         cart_total = request.data.get('cart_total', 0)
         
         try:
@@ -214,89 +234,179 @@ class CouponViewSet(viewsets.ModelViewSet):
                 'message': 'Cupón no encontrado'
             }, status=404)
 
+class CouponCampaignViewSet(viewsets.ModelViewSet):
+    queryset = CouponCampaign.objects.all()
+    serializer_class = CouponCampaignSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        return CouponCampaign.objects.annotate(coupons_count=Count('coupons'))
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {'message': 'La campaña tiene cupones y no se puede eliminar'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+    @action(detail=True, methods=['post'])
+    def generate(self, request, pk=None):
+        campaign = self.get_object()
+        try:
+            count = int(request.data.get('count', 0))
+        except (TypeError, ValueError):
+            count = 0
+        if not 0 < count <= MAX_CAMPAIGN_CODES:
+            return Response({
+                'message': f'La cantidad debe estar entre 1 y {MAX_CAMPAIGN_CODES}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # La generación corre en el worker; la petición solo encola el trabajo.
+        # Se pasa el total deseado para que un reintento no duplique cupones
+        target_total = campaign.coupons_count + count
+        job = enqueue(
+            'store.coupons.generate_campaign_codes',
+            campaign_id=campaign.pk,
+            target_total=target_total
+        )
+        return Response(
+            {'job': job.pk, 'count': count, 'target_total': target_total},
+            status=status.HTTP_202_ACCEPTED
+        )
+
 # Actualizar CartItemViewSet para incluir descuentos
 class CartItemViewSet(viewsets.ModelViewSet):
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
 
+    def get_queryset(self):
+        user = self.request.user if self.request.user.is_authenticated else None
+        return cart_items_for(user)
+
+    def perform_create(self, serializer):
+        user = self.request.user if self.request.user.is_authenticated else None
+        with transaction.atomic():
+            item = serializer.save(user=user)
+            try:
+                reserve_stock(item.product_id, item.quantity, cart_item=item)
+            except InsufficientStock:
+                raise ValidationError({'quantity': 'No hay stock suficiente para este producto'})
+        record_cart_add(item.product_id, item.quantity)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            release_cart_item(serializer.instance)
+            item = serializer.save()
+            try:
+                reserve_stock(item.product_id, item.quantity, cart_item=item)
+            except InsufficientStock:
+                raise ValidationError({'quantity': 'No hay stock suficiente para este producto'})
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            release_cart_item(instance)
+            instance.delete()
+
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        serializer = CartQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        user = request.user if request.user.is_authenticated else None
+
+        try:
+            quote = price_cart(
+                [(item['product_id'], item['quantity']) for item in data['items']],
+                coupon_code=data.get('coupon_code'),
+                user=user
+            )
+        except PricingError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        coupon = None
+        if data.get('coupon_code'):
+            coupon = {
+                'code': data['coupon_code'].strip().upper(),
+                'valid': quote['coupon'] is not None,
+                'discount_amount': str(quote['coupon_discount']),
+                'message': quote['coupon_error'] or 'Cupón aplicado exitosamente'
+            }
+
+        return Response({
+            'lines': [
+                {
+                    'product_id': line['product'].pk,
+                    'name': line['product'].name,
+                    'quantity': line['quantity'],
+                    'unit_price': str(line['unit_price']),
+                    'discount_amount': str(line['discount_amount']),
+                    'discount': {
+                        'id': line['discount'].pk,
+                        'name': line['discount'].name,
+                    } if line['discount'] else None,
+                    'final_price': str(line['final_price']),
+                    'line_total': str(line['line_total']),
+                }
+                for line in quote['lines']
+            ],
+            'subtotal': str(quote['subtotal']),
+            'discount_total': str(quote['discount_total']),
+            'coupon': coupon,
+            'total': str(quote['total']),
+            'priced_at': quote['priced_at'],
+        })
+
+    # Obsoleto: el frontend debe usar quote, que valora el carrito en el
+    # servidor. Se mantiene por compatibilidad y aplica las mismas reglas de
+    # pricing.coupon_error sobre el total que envía el cliente
     @action(detail=False, methods=['post'])
     def apply_coupon(self, request):
         code = request.data.get('code', '').strip().upper()
         try:
             cart_total = Decimal(str(request.data.get('cart_total', '0')))
-        except:
+        except InvalidOperation:
             return Response({
                 'valid': False,
                 'message': 'Total del carrito inválido'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        print(f"Intentando aplicar cupón: {code}")
-        print(f"Total del carrito: {cart_total}")
-        
-        try:
-            coupon = Coupon.objects.get(code__iexact=code)
-            print(f"Cupón encontrado: {coupon}")
-            print(f"Cupón activo: {coupon.active}")
-            print(f"Validez: {coupon.valid_from} - {coupon.valid_to}")
-            print(f"Minimum purchase: {coupon.minimum_purchase}")
-            
-            now = timezone.now()
-            if not coupon.active:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón no está activo'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if now < coupon.valid_from:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón aún no es válido'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if now > coupon.valid_to:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón ha expirado'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if coupon.max_uses and coupon.current_uses >= coupon.max_uses:
-                return Response({
-                    'valid': False,
-                    'message': 'El cupón ha alcanzado el límite de usos'
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            if cart_total < coupon.minimum_purchase:
-                return Response({
-                    'valid': False,
-                    'message': f'El monto mínimo de compra es ${coupon.minimum_purchase}'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Calcular descuento
-            discount_amount = coupon.calculate_discount(cart_total)
-            print(f"Descuento calculado: {discount_amount}")
-            
-            return Response({
-                'valid': True,
-                'discount_amount': str(discount_amount),
-                'final_total': str(cart_total - discount_amount),
-                'message': 'Cupón aplicado exitosamente'
-            })
-            
-        except Coupon.DoesNotExist:
+        coupon = Coupon.objects.filter(code=code).first()
+        if coupon is None:
             return Response({
                 'valid': False,
                 'message': 'Cupón no encontrado'
-            }, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            print(f"Error al aplicar cupón: {str(e)}")
+            }, status=status.HTTP_404_NOT_FOUND, headers={'Deprecation': 'true'})
+
+        now = timezone.now()
+        user = request.user if request.user.is_authenticated else None
+        error = coupon_error(coupon, cart_total, now, user=user)
+        if error:
             return Response({
                 'valid': False,
-                'message': 'Error al procesar el cupón'
-            }, status=status.HTTP_400_BAD_REQUEST)
-            
+                'message': error
+            }, status=status.HTTP_400_BAD_REQUEST, headers={'Deprecation': 'true'})
+
+        discount_amount = coupon.calculate_discount(cart_total, now=now)
+        return Response({
+            'valid': True,
+            'discount_amount': str(discount_amount),
+            'final_total': str(cart_total - discount_amount),
+            'message': 'Cupón aplicado exitosamente'
+        }, headers={'Deprecation': 'true'})
+
 class PaymentVerificationView(APIView):
     def post(self, request):
         order_id = request.data.get('orderID')
+
+        # Un reintento de una orden ya registrada no vuelve a consultar PayPal
+        existing = Order.objects.filter(payment_id=order_id).first()
+        if existing is not None:
+            return Response({'status': 'success', 'order': existing.pk})
+
+        # requests solo se importa cuando hace falta, no al arrancar cada worker
+        import requests
         
         # Obtener token de acceso
         auth_response = requests.post(
@@ -316,10 +426,166 @@ class PaymentVerificationView(APIView):
         order_data = order_response.json()
         
         if order_data['status'] == 'COMPLETED':
-            # Procesar la orden en tu sistema
-            return Response({'status': 'success'})
+            user = request.user if request.user.is_authenticated else None
+            try:
+                paid_amount, currency = paypal_amount(order_data.get('purchase_units'))
+                order, _ = place_order(
+                    order_id,
+                    request.data.get('cart_items', []),
+                    user=user,
+                    coupon_code=request.data.get('coupon_code'),
+                    paid_amount=paid_amount,
+                    currency=currency
+                )
+            except InsufficientStock:
+                return Response(
+                    {'status': 'error', 'message': 'Stock insuficiente'},
+                    status=409
+                )
+            except (OrderError, PricingError) as e:
+                return Response(
+                    {'status': 'error', 'message': str(e)},
+                    status=400
+                )
+            return Response({'status': 'success', 'order': order.pk})
         else:
             return Response(
                 {'status': 'error', 'message': 'Payment not completed'}, 
                 status=400
-            )
\ No newline at end of file
+            )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(catalogue_cache.stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_report_view(request):
+    query = ReportQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    end = params.get('end') or timezone.now()
+    start = params.get('start') or end - timedelta(days=7)
+
+    coupon = None
+    if params.get('coupon'):
+        coupon = Coupon.objects.filter(code=params['coupon'].strip().upper()).first()
+        if coupon is None:
+            return Response({'message': 'Cupón no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    report = sales_report(start, end, params['period'], coupon)
+    data = {
+        'start': report['start'],
+        'end': report['end'],
+        'period': report['period'],
+        'totals': SalesTotalsSerializer(report['totals']).data,
+        'series': SalesRollupSerializer(report['series'], many=True).data,
+    }
+    if coupon is not None:
+        data['coupon'] = {
+            'code': report['coupon']['code'],
+            'totals': CouponTotalsSerializer(report['coupon']['totals']).data,
+            'series': CouponRollupSerializer(report['coupon']['series'], many=True).data,
+        }
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profiling_samples(request):
+    shared = shared_storage()
+    return Response({
+        'shared_cache': shared,
+        'warning': None if shared else LOCAL_CACHE_WARNING,
+        'samples': ProfileSampleSerializer(list_samples(), many=True).data,
+    })
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def profiling_config(request):
+    if request.method == 'POST':
+        serializer = ProfilingConfigSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            config = set_config(**serializer.validated_data)
+        except ProfilingError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(dict(config, shared_cache=shared_storage()))
+    return Response(dict(get_config(), shared_cache=shared_storage()))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profiling_sample(request, sample_id):
+    sample = get_sample(sample_id)
+    if sample is None:
+        return Response({'message': 'Muestra no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+    # ?output=pstats descarga el fichero para pstats/snakeviz; ?output=collapsed
+    # devuelve las pilas en el formato de flamegraph.pl
+    output = request.query_params.get('output', 'text')
+    if 'pstats' in sample:
+        if output == 'pstats':
+            response = HttpResponse(sample['pstats'], content_type='application/octet-stream')
+            response['Content-Disposition'] = f'attachment; filename="profile-{sample_id}.pstats"'
+            return response
+        return HttpResponse(render_pstats_text(sample), content_type='text/plain')
+    return HttpResponse(render_collapsed(sample), content_type='text/plain')
+
+
+
+class PaymentCheckoutView(APIView):
+    # El cliente registra el carrito antes de capturar el pago en PayPal; la
+    # orden se completa al llegar el webhook, sin consultar PayPal desde aquí
+    def post(self, request):
+        user = request.user if request.user.is_authenticated else None
+        serializer = PaymentCheckoutSerializer(data=request.data, context={'user': user})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            checkout = register_checkout(
+                data['orderID'],
+                data['cart_items'],
+                user=user,
+                coupon_code=data['coupon_code']
+            )
+        except CheckoutConflict as e:
+            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({'status': checkout.status}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def payment_status(request, payment_id):
+    # Cualquiera con el ID de PayPal ve el estado; la orden y el error solo
+    # se muestran al usuario del pago (o a staff)
+    order = Order.objects.filter(payment_id=payment_id).first()
+    checkout = PendingPayment.objects.filter(payment_id=payment_id).first()
+    if order is None and checkout is None:
+        return Response({'message': 'Pago no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    data = {'status': 'completed' if order is not None else checkout.status}
+    owner_id = order.user_id if order is not None else checkout.user_id
+    if request.user.is_staff or (owner_id is not None and owner_id == request.user.pk):
+        data['order'] = order.pk if order is not None else checkout.order_id
+        data['message'] = checkout.error if checkout is not None else ''
+    return Response(data)
+
+
+class PayPalWebhookView(APIView):
+    # Solo se verifica la firma y se guarda el evento; el procesamiento va por
+    # lotes en la cola de trabajos (store.payments.process_payment_events)
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        body = request.body
+        try:
+            verify_signature(request.headers, body)
+            _, created = ingest_event(json.loads(body))
+        except (WebhookError, ValueError) as e:
+            return Response({'status': 'error', 'message': str(e)}, status=400)
+        return Response({'status': 'received' if created else 'duplicate'})
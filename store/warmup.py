@@ -0,0 +1,62 @@
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from rest_framework.utils.model_meta import get_field_info
+
+from .catalogue import category_rows, warm_product_entries
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WARMUP_PRODUCTS = 200
+
+
+def warm_serializers():
+    # Las instancias de los serializers no se reutilizan entre peticiones; lo
+    # que sí persiste son las cachés de Model._meta que recorren al construir
+    # sus campos (get_field_info). La primera llamada a get_fields() de cada
+    # modelo construye el árbol de relaciones inversas de todo el registro.
+    for model in apps.get_models():
+        model._meta.get_fields()
+        get_field_info(model)
+
+
+def warm_catalogue(products=None):
+    if products is None:
+        products = getattr(settings, 'STORE_WARMUP_PRODUCTS', DEFAULT_WARMUP_PRODUCTS)
+    category_rows()
+    return warm_product_entries(Product.objects.filter(available=True).order_by('-created')[:products])
+
+
+def warmup(products=None):
+    timings = {}
+
+    started = time.perf_counter()
+    warm_serializers()
+    timings['serializers'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    connection.ensure_connection()
+    timings['connection'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    timings['products'] = warm_catalogue(products)
+    timings['catalogue'] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def warmup_on_boot():
+    if not getattr(settings, 'STORE_WARMUP_ON_BOOT', True):
+        return
+    try:
+        timings = warmup()
+    except Exception:
+        # El precalentamiento es opcional: con la base de datos sin migrar o
+        # la caché (Redis) inaccesible el worker arranca en frío
+        logger.warning('No se pudo precalentar el catálogo', exc_info=True)
+    else:
+        logger.info('Catálogo precalentado: %s', timings)